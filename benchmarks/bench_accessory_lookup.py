@@ -0,0 +1,67 @@
+"""
+Per message cost of probe lookups with many probes per grill.
+
+Every probe entity looks up its accessory on every message. This compares
+the old linear scan of status["acc"] (O(probes^2) per message) with the
+uuid index GrillSnapshot builds once at ingest.
+
+    python -m benchmarks.bench_accessory_lookup --probes 1 4 16 64
+"""
+import argparse
+import json
+import time
+
+from custom_components.traeger.snapshot import index_accessories
+
+from .payloads import status_payload
+
+
+def linear_lookup(status, accessory_id):
+    for accessory in status["acc"]:
+        if accessory["uuid"] == accessory_id:
+            return accessory
+    return None
+
+
+def run_linear(messages, uuids):
+    for message in messages:
+        status = message["status"]
+        for uuid in uuids:
+            linear_lookup(status, uuid)
+
+
+def run_indexed(messages, uuids):
+    for message in messages:
+        accessories = index_accessories(message["status"])
+        for uuid in uuids:
+            accessories.get(uuid)
+
+
+def measure(func, messages, uuids, rounds):
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func(messages, uuids)
+        best = min(best, time.perf_counter() - start)
+    return best / len(messages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'probes':>6} {'linear us/msg':>14} {'indexed us/msg':>15}")
+    for probes in args.probes:
+        payload = json.dumps(status_payload("bench", probes=probes))
+        messages = [json.loads(payload) for _ in range(args.messages)]
+        uuids = [accessory["uuid"] for accessory in messages[0]["status"]["acc"]]
+        linear = measure(run_linear, messages, uuids, args.rounds)
+        indexed = measure(run_indexed, messages, uuids, args.rounds)
+        print(f"{probes:>6} {linear * 1e6:>14.2f} {indexed * 1e6:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+End-to-end ingest: from mqtt_onmessage to Home Assistant state writes.
+
+Builds a real HomeAssistant core with the integration's climate, sensor,
+switch and number entities (probe entities included) added through entity
+platforms, then feeds synthetic status messages one at a time through
+traeger.mqtt_onmessage, the ingest, grill_message, the subscription
+dispatch, grill_refresh_state and async_write_ha_state. Reports, per grill
+and probe count:
+
+    msg/s        messages fully processed per second
+    p50/p99 us   latency from mqtt_onmessage until every state is written
+    writes/msg   state changes fired per message
+    peak KiB/msg memory allocated while handling one message (tracemalloc peak)
+    kept B/msg   memory still held afterwards, per message
+
+    python -m benchmarks.bench_ingest --grills 1 16 --probes 1 4
+
+Save a run with --save and check a later one against it with --compare;
+the exit status is 1 when throughput or p99 is worse by more than
+--threshold percent.
+
+    python -m benchmarks.bench_ingest --save baseline.json
+    python -m benchmarks.bench_ingest --compare baseline.json
+
+--stall-threshold runs the client with the stall watchdog on, to measure
+what it costs per message.
+"""
+import argparse
+import asyncio
+from datetime import timedelta
+import importlib
+import json
+import logging
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from homeassistant.const import EVENT_STATE_CHANGED
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import device_registry, entity, entity_registry
+from homeassistant.helpers.entity_platform import EntityPlatform
+
+from custom_components.traeger.const import DOMAIN, PLATFORMS
+from custom_components.traeger.traeger import traeger
+
+from .payloads import status_messages
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class Message:
+    __slots__ = ("topic", "payload")
+
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+
+class BenchEntry:
+    entry_id = "bench"
+    options = {}
+
+    def __init__(self):
+        self.on_unload = []
+
+    def async_on_unload(self, func):
+        self.on_unload.append(func)
+
+
+async def setup_integration(hass, grill_ids, stall_threshold=0):
+    client = traeger("bench", "password", hass, None, stall_threshold=stall_threshold)
+    client.grills = [{"thingName": grill_id} for grill_id in grill_ids]
+    entry = BenchEntry()
+    hass.data[DOMAIN] = {entry.entry_id: client}
+    for domain in PLATFORMS:
+        platform = EntityPlatform(
+            hass=hass,
+            logger=_LOGGER,
+            domain=domain,
+            platform_name=DOMAIN,
+            platform=None,
+            scan_interval=timedelta(seconds=30),
+            entity_namespace=None,
+        )
+        module = importlib.import_module(f"custom_components.traeger.{domain}")
+        await module.async_setup_entry(
+            hass, entry, lambda entities, platform=platform: hass.async_create_task(platform.async_add_entities(entities))
+        )
+    await hass.async_block_till_done()
+    return client
+
+
+async def feed(client, message):
+    """Push one message and wait until the event loop has handled it."""
+    client.mqtt_onmessage(None, None, message)
+    while client.ingest.pending():
+        await asyncio.sleep(0)
+
+
+async def run_case(grills, probes, count, alloc_count, stall_threshold=0):
+    hass = HomeAssistant()
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass.config.config_dir = config_dir
+        entity.async_setup(hass)
+        await device_registry.async_load(hass)
+        await entity_registry.async_load(hass)
+        grill_ids = [f"grill{index:03d}" for index in range(grills)]
+        client = await setup_integration(hass, grill_ids, stall_threshold)
+        streams = {grill_id: status_messages(grill_id, count // grills + 1, probes) for grill_id in grill_ids}
+        messages = [
+            Message(f"prod/thing/update/{grill_id}", streams[grill_id][index])
+            for index in range(count // grills + 1) for grill_id in grill_ids
+        ][:count]
+        for grill_id in grill_ids:                              #First message adds the probe entities
+            await feed(client, Message(f"prod/thing/update/{grill_id}", streams[grill_id][-1]))
+        await hass.async_block_till_done()
+        entities = len(hass.states.async_all())
+
+        writes = 0
+
+        def count_write(event):
+            nonlocal writes
+            writes += 1
+
+        hass.bus.async_listen(EVENT_STATE_CHANGED, count_write)
+        latencies = []
+        started = time.perf_counter()
+        for message in messages:
+            sent = time.perf_counter()
+            await feed(client, message)
+            latencies.append(time.perf_counter() - sent)
+        elapsed = time.perf_counter() - started
+        await hass.async_block_till_done()
+
+        tracemalloc.start()
+        start_memory = tracemalloc.get_traced_memory()[0]
+        peaks = []
+        for message in messages[:alloc_count]:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            await feed(client, message)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        kept = tracemalloc.get_traced_memory()[0] - start_memory
+        tracemalloc.stop()
+        await hass.async_stop(force=True)
+
+    latencies.sort()
+    used = len(peaks)
+    return {
+        "entities": entities,
+        "rate": len(messages) / elapsed,
+        "p50": latencies[len(latencies) // 2] * 1e6,
+        "p99": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e6,
+        "writes": writes / len(messages),
+        "peak": sum(peaks) / used / 1024 if used else 0,
+        "kept": kept / used if used else 0,
+    }
+
+
+async def run(args):
+    print(f"{'grills':>6} {'probes':>6} {'entities':>8} {'msg/s':>8} {'p50 us':>8} {'p99 us':>8} "
+          f"{'writes/msg':>10} {'peak KiB/msg':>12} {'kept B/msg':>10}")
+    results = {}
+    for grills in args.grills:
+        for probes in args.probes:
+            result = await run_case(grills, probes, args.messages, args.alloc_messages,
+                                    args.stall_threshold / 1000)
+            results[f"{grills}x{probes}"] = result
+            print(f"{grills:>6} {probes:>6} {result['entities']:>8} {result['rate']:>8.0f} {result['p50']:>8.0f} "
+                  f"{result['p99']:>8.0f} {result['writes']:>10.1f} {result['peak']:>12.1f} {result['kept']:>10.0f}")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print the change against a saved run, return False on a regression."""
+    passed = True
+    for case, result in results.items():
+        if case not in baseline:
+            continue
+        rate = (result["rate"] / baseline[case]["rate"] - 1) * 100
+        p99 = (result["p99"] / baseline[case]["p99"] - 1) * 100
+        regressed = rate < -threshold or p99 > threshold
+        passed = passed and not regressed
+        print(f"{case:>13}: msg/s {rate:+6.1f}%  p99 {p99:+6.1f}%{'  REGRESSION' if regressed else ''}")
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--grills", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--alloc-messages", type=int, default=200)
+    parser.add_argument("--stall-threshold", type=float, default=0,
+                        help="milliseconds, run with the stall watchdog on (0 leaves it off)")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare against results saved with --save")
+    parser.add_argument("--threshold", type=float, default=20, help="percent worse that counts as a regression")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    results = asyncio.run(run(args))
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            if not compare(results, json.load(file), args.threshold):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Decode time per Traeger status message for each available JSON backend.
+
+Decodes the same recorded-style status payloads from bytes (as paho hands
+them over) and from memoryview (as the asyncio transport does).
+
+    python -m benchmarks.bench_json_decode --probes 4
+"""
+import argparse
+import time
+
+from custom_components.traeger.decoder import DECODERS
+
+from .payloads import status_messages
+
+
+def measure(loads, payloads, rounds):
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for payload in payloads:
+            loads(payload)
+        best = min(best, time.perf_counter() - start)
+    return best / len(payloads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--probes", type=int, default=2)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    payloads = status_messages("bench", args.messages, probes=args.probes)
+    views = [memoryview(payload) for payload in payloads]
+    size = sum(len(payload) for payload in payloads) / len(payloads)
+    print(f"{args.messages} messages, {size:.0f} bytes average")
+    print(f"{'backend':<8} {'bytes us/msg':>13} {'memoryview us/msg':>18}")
+    for name, loads in DECODERS.items():
+        from_bytes = measure(loads, payloads, args.rounds)
+        from_view = measure(loads, views, args.rounds)
+        print(f"{name:<8} {from_bytes * 1e6:>13.2f} {from_view * 1e6:>18.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Compare the paho thread transport with the asyncio transport.
+
+Runs the benchmark broker in a child process and measures, for each
+transport, messages per second and client CPU time for the same stream of
+status payloads. Use --rate to compare CPU at a fixed message rate.
+
+    python -m benchmarks.bench_mqtt_transport --messages 20000
+    python -m benchmarks.bench_mqtt_transport --messages 5000 --rate 500
+"""
+import argparse
+import asyncio
+import multiprocessing
+import threading
+import time
+
+import aiohttp
+import paho.mqtt.client as mqtt
+
+from custom_components.traeger.mqtt_async import AsyncMqttClient
+
+from .mqtt_broker import run_broker
+from .payloads import status_messages
+
+TOPIC = "prod/thing/update/bench"
+
+
+def run_paho(port, count):
+    done = threading.Event()
+    received = 0
+
+    def on_connect(client, userdata, flags, rc):
+        client.subscribe((TOPIC, 1))
+
+    def on_message(client, userdata, message):
+        nonlocal received
+        received += 1
+        if received == count:
+            done.set()
+
+    client = mqtt.Client(transport="websockets")
+    client.on_connect = on_connect
+    client.on_message = on_message
+    client.ws_set_options(path="/mqtt")
+    wall, cpu = time.perf_counter(), time.process_time()
+    client.connect("127.0.0.1", port, keepalive=300)
+    client.loop_start()
+    threads = threading.active_count()
+    done.wait()
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    client.disconnect()
+    client.loop_stop()
+    return wall, cpu, threads
+
+
+async def run_asyncio(port, count):
+    done = asyncio.Event()
+    received = 0
+
+    def on_connect(client, userdata, flags, rc):
+        client.subscribe((TOPIC, 1))
+
+    def on_message(client, userdata, message):
+        nonlocal received
+        received += 1
+        if received == count:
+            done.set()
+
+    async with aiohttp.ClientSession() as session:
+        client = AsyncMqttClient(session, "bench")
+        client.on_connect = on_connect
+        client.on_message = on_message
+        wall, cpu = time.perf_counter(), time.process_time()
+        client.connect_async(f"ws://127.0.0.1:{port}/mqtt")
+        threads = threading.active_count()
+        await done.wait()
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        await client.async_disconnect()
+    return wall, cpu, threads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--rate", type=int, default=0, help="messages per second, 0 for flood")
+    parser.add_argument("--port", type=int, default=18883)
+    args = parser.parse_args()
+
+    payloads = status_messages("bench", args.messages)
+    print(f"{'transport':<10} {'msgs':>7} {'wall s':>8} {'msg/s':>9} {'cpu s':>7} {'cpu us/msg':>10} {'threads':>7}")
+    for index, transport in enumerate(("paho", "asyncio")):
+        port = args.port + index
+        broker = multiprocessing.Process(target=run_broker, args=(port, payloads, args.rate), daemon=True)
+        broker.start()
+        time.sleep(1)
+        try:
+            if transport == "paho":
+                wall, cpu, threads = run_paho(port, args.messages)
+            else:
+                wall, cpu, threads = asyncio.run(run_asyncio(port, args.messages))
+        finally:
+            broker.terminate()
+            broker.join()
+        print(f"{transport:<10} {args.messages:>7} {wall:>8.3f} {args.messages / wall:>9.0f} "
+              f"{cpu:>7.3f} {cpu / args.messages * 1e6:>10.1f} {threads:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Threads and memory used by N accounts (config entries) at once.
+
+Starts N clients, one account each, against the local cloud stand-in,
+waits until every one has received a status, then reports the extra
+threads and the Python memory (tracemalloc) they hold:
+
+    threads  paho, one network thread per account (the old design)
+    paho     paho, all accounts driven by one shared TraegerReactor
+    asyncio  asyncio transport on the shared TraegerReactor
+
+    python -m benchmarks.bench_reactor --accounts 1 10 50
+"""
+import argparse
+import asyncio
+import threading
+import tracemalloc
+
+import aiohttp
+
+from custom_components.traeger.const import MQTT_TRANSPORT_ASYNCIO, MQTT_TRANSPORT_PAHO
+from custom_components.traeger.reactor import TraegerReactor
+
+from .bench_startup import MemoryStore, bench_client
+from .fake_cloud import FakeCloud
+
+
+class ThreadPerClientReactor(TraegerReactor):
+    """Runs every paho client in a loop_forever thread of its own."""
+
+    def connect(self, client, host, port, keepalive, watchdog=None):
+        def run():
+            client.connect(host, port, keepalive=keepalive)
+            client.loop_forever()
+
+        thread = threading.Thread(target=run, daemon=True)
+        self.clients[client] = thread
+        thread.start()
+
+    def disconnect(self, client):
+        client.disconnect()
+        future = self.loop.create_future()
+        future.set_result(None)
+        return future
+
+    async def async_disconnect(self, client):
+        client.disconnect()
+        thread = self.clients.pop(client)
+        await self.loop.run_in_executor(None, thread.join)
+
+
+async def run_accounts(cloud, session, count, mode):
+    loop = asyncio.get_running_loop()
+    shared = TraegerReactor(loop)
+    transport = MQTT_TRANSPORT_ASYNCIO if mode == "asyncio" else MQTT_TRANSPORT_PAHO
+    threads = threading.active_count()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    clients = []
+    ready = []
+    for index in range(count):
+        username = f"bench{index}"
+        reactor = ThreadPerClientReactor(loop) if mode == "threads" else shared
+        client = bench_client(cloud, session, username, MemoryStore(), mqtt_transport=transport, reactor=reactor)
+        event = asyncio.Event()
+        client.set_callback_for_grill(cloud.grills_of(username)[0].thing_name, event.set)
+        await client.load_token()
+        await client.start(0)
+        clients.append(client)
+        ready.append(event)
+    await asyncio.gather(*[event.wait() for event in ready])
+    memory = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    extra_threads = threading.active_count() - threads
+    for client in clients:
+        await client.kill()
+    shared.shutdown()                                       #As async_unload_entry does after the last entry
+    return extra_threads, memory
+
+
+async def run(args):
+    cloud = FakeCloud({f"bench{index}": "password" for index in range(max(args.accounts))}, command_delay=0)
+    await cloud.start(port=args.port)
+    try:
+        async with aiohttp.ClientSession() as session:
+            print(f"{'mode':<8} {'accounts':>8} {'threads':>8} {'KiB':>9} {'KiB/account':>12}")
+            for mode in args.modes:
+                for count in args.accounts:
+                    threads, memory = await run_accounts(cloud, session, count, mode)
+                    print(f"{mode:<8} {count:>8} {threads:>8} {memory / 1024:>9.0f} {memory / 1024 / count:>12.1f}")
+    finally:
+        await cloud.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--modes", nargs="+", default=["threads", "paho", "asyncio"])
+    parser.add_argument("--port", type=int, default=18895)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Time from config entry setup to the first entity with real state.
+
+Replays what async_setup_entry does against the local cloud stand-in
+(fixed latency per API request), for three cases:
+
+    delayed  nothing persisted, connect after --delay seconds (old behaviour)
+    cold     nothing persisted, connect right away
+    warm     grill list and last status restored from storage
+
+The clock stops once start() has returned (the platforms are set up right
+after) and the grill has a snapshot entities can read.
+
+    python -m benchmarks.bench_startup --latency 0.3
+    python -m benchmarks.bench_startup --delay 0 --rounds 5
+
+--stall-threshold runs the clients with the stall watchdog on, which also
+exercises its task wrapping on the start(), syncmain() and main() path.
+"""
+import argparse
+import asyncio
+import time
+
+import aiohttp
+
+from custom_components.traeger.const import MQTT_TRANSPORT_ASYNCIO
+from custom_components.traeger.traeger import traeger
+
+from .fake_cloud import FakeCloud
+
+
+class FakeHass:
+    def __init__(self, loop):
+        self.loop = loop
+
+    def async_create_task(self, coro):
+        return self.loop.create_task(coro)
+
+
+class MemoryStore:
+    """Stands in for homeassistant.helpers.storage.Store."""
+
+    def __init__(self, data=None):
+        self.data = data
+
+    async def async_load(self):
+        return self.data
+
+    async def async_save(self, data):
+        self.data = data
+
+    def async_delay_save(self, data_func, delay=0):
+        self.data = data_func()
+
+
+def bench_client(cloud, session, username, token_store, state_store=None, mqtt_transport=MQTT_TRANSPORT_ASYNCIO,
+                 **kwargs):
+    """A client for one of the cloud stand-in's accounts."""
+    loop = asyncio.get_running_loop()
+    return traeger(username, cloud.users[username], FakeHass(loop), session, mqtt_transport, token_store,
+                   state_store=state_store, api_url=cloud.api_url, cognito_url=cloud.cognito_url, **kwargs)
+
+
+async def setup(cloud, session, token_store, state, delay, stall_threshold=0):
+    """Mirror async_setup_entry and return the seconds until the grill has state."""
+    client = bench_client(cloud, session, "bench", token_store, MemoryStore(state), stall_threshold=stall_threshold)
+    thing_name = cloud.grills_of("bench")[0].thing_name
+    ready = asyncio.Event()
+    client.set_callback_for_grill(thing_name, ready.set)
+    started = time.perf_counter()
+    await client.load_token()
+    await client.load_state()
+    await client.start(delay)
+    if client.get_snapshot_for_device(thing_name) is None:
+        await ready.wait()
+    elapsed = time.perf_counter() - started
+    saved = client.state_data()
+    await client.kill()
+    return elapsed, saved
+
+
+async def run(args):
+    cloud = FakeCloud(latency=args.latency, command_delay=args.command_delay)
+    await cloud.start(port=args.port)
+    try:
+        async with aiohttp.ClientSession() as session:
+            token_store = MemoryStore()                     #Logged in once, like an existing entry
+            stall_threshold = args.stall_threshold / 1000
+            _, state = await setup(cloud, session, token_store, None, 0, stall_threshold)
+            cases = (("delayed", None, args.delay), ("cold", None, 0), ("warm", state, 0))
+            print(f"{'case':<8} {'best s':>8} {'mean s':>8}")
+            for name, stored, delay in cases:
+                times = [(await setup(cloud, session, token_store, stored, delay, stall_threshold))[0]
+                         for _ in range(args.rounds)]
+                print(f"{name:<8} {min(times):>8.3f} {sum(times) / len(times):>8.3f}")
+    finally:
+        await cloud.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds per cloud API request")
+    parser.add_argument("--command-delay", type=float, default=0.2, help="seconds from command to status")
+    parser.add_argument("--delay", type=float, default=30, help="connect delay of the delayed case")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--port", type=int, default=18893)
+    parser.add_argument("--stall-threshold", type=float, default=0,
+                        help="milliseconds, run with the stall watchdog on (0 leaves it off)")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,410 @@
+"""
+Local stand-in for the Traeger cloud, for offline testing and load generation.
+
+Serves everything the client talks to on one port:
+
+    POST /cognito                          Cognito InitiateAuth, password and refresh token flows
+    GET  /prod/users/self                  the account and its grills
+    POST /prod/mqtt-connections            a signed websocket URL valid for --url-ttl seconds
+    POST /prod/things/<thingName>/commands
+    GET  /mqtt                             websocket MQTT broker, only with a valid signed URL
+
+Simulated grills answer "90" with their status and apply set temperature
+("11,<temp>"), timer, probe, keep warm, super smoke and shutdown commands,
+publishing the new status after --command-delay like the real cloud. With
+--update-interval they also report on their own, with temperatures moving
+toward the set points and pellets burning down. --lost-updates drops that
+fraction of the statuses that follow a command ("90" is always answered),
+as the real cloud sometimes does.
+
+    python -m benchmarks.fake_cloud --grills 200 --port 8080
+
+Point a client at it with
+    traeger(..., api_url="http://127.0.0.1:8080/prod", cognito_url="http://127.0.0.1:8080/cognito")
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import random
+import secrets
+import struct
+import time
+
+from aiohttp import web
+
+from custom_components.traeger.mqtt_async import (
+    CONNACK,
+    CONNECT,
+    DISCONNECT,
+    PINGREQ,
+    PINGRESP,
+    PUBLISH,
+    SUBACK,
+    SUBSCRIBE,
+    PacketReader,
+    build_packet,
+    build_string,
+)
+
+from .payloads import status_payload
+
+TOPIC_PREFIX = "prod/thing/update/"
+HEATING = (4, 5, 6, 7)          # Igniting, preheating, manual and custom cook
+AMBIENT = 72
+
+
+class SimulatedGrill:
+    """One grill: its status, how commands change it and how it drifts over time."""
+
+    def __init__(self, thing_name, owner, probes=1, rng=None):
+        rng = rng or random.Random()
+        self.thing_name = thing_name
+        self.owner = owner
+        self.message = status_payload(thing_name, probes=probes)
+        status = self.message["status"]
+        status["set"] = rng.choice((180, 225, 250, 275, 300))
+        status["grill"] = status["set"] + rng.randint(-10, 10)
+        status["pellet_level"] = rng.randint(30, 100)
+        for accessory in status["acc"]:
+            accessory["probe"]["get_temp"] = rng.randint(40, 150)
+        self.pellets = float(status["pellet_level"])
+        self.temps = {"grill": float(status["grill"])}
+        for accessory in status["acc"]:
+            self.temps[accessory["uuid"]] = float(accessory["probe"]["get_temp"])
+
+    @property
+    def status(self):
+        return self.message["status"]
+
+    def payload(self):
+        self.status["time"] = int(time.time())
+        return json.dumps(self.message).encode("utf-8")
+
+    def apply(self, command):
+        """Apply a command, return True if the grill reports afterwards."""
+        code, _, value = command.partition(",")
+        status = self.status
+        if code == "90":
+            return True
+        if code == "11":
+            status["set"] = int(value)
+            if status["system_status"] in (2, 3):
+                status["system_status"] = 4
+        elif code == "12":
+            status["cook_timer_start"] = int(time.time())
+            status["cook_timer_end"] = status["cook_timer_start"] + int(value)
+            status["cook_timer_complete"] = 0
+        elif code == "14":
+            for accessory in status["acc"]:
+                if accessory["con"]:
+                    accessory["probe"]["set_temp"] = int(value)
+                    accessory["probe"]["alarm_fired"] = 0
+            status["probe_set"] = int(value)
+        elif code == "17":
+            if status["system_status"] in HEATING:
+                status["system_status"] = 8
+        elif code in ("18", "19"):
+            status["keepwarm"] = 1 if code == "18" else 0
+        elif code in ("20", "21"):
+            status["smoke"] = 1 if code == "20" else 0
+        else:
+            return False
+        return True
+
+    def step(self, elapsed):
+        """Advance the simulation, return True if the grill is active and reports."""
+        status = self.status
+        mode = status["system_status"]
+        grill = self.temps["grill"]
+        if mode in HEATING:
+            grill += max(-3.0, min(5.0, status["set"] - grill)) * min(elapsed, 1.0)
+            self.pellets = max(0.0, self.pellets - 0.002 * elapsed)
+            if mode in (4, 5) and abs(status["set"] - grill) < 5:
+                status["system_status"] = 6
+        elif mode == 8:
+            grill -= min(3.0 * elapsed, grill - AMBIENT)
+            if grill < AMBIENT + 30:
+                status["system_status"] = 9
+        else:
+            return False
+        self.temps["grill"] = grill
+        status["grill"] = int(grill)
+        status["pellet_level"] = int(self.pellets)
+        for accessory in status["acc"]:
+            if not accessory["con"]:
+                continue
+            probe = accessory["probe"]
+            temp = self.temps[accessory["uuid"]]
+            temp += (grill - temp) * 0.002 * elapsed
+            self.temps[accessory["uuid"]] = temp
+            probe["get_temp"] = int(temp)
+            if probe["set_temp"] and probe["get_temp"] >= probe["set_temp"]:
+                probe["alarm_fired"] = 1
+        if status["acc"]:
+            status["probe"] = status["acc"][0]["probe"]["get_temp"]
+        if status["cook_timer_end"] and time.time() >= status["cook_timer_end"]:
+            status["cook_timer_complete"] = 1
+        return True
+
+
+class FakeCloud:
+    """Cognito, REST API and MQTT broker for simulated accounts and grills.
+
+    users maps username to password; every user owns grills_per_user grills
+    named <username>-<index>. Counters in stats show what clients did.
+    """
+
+    def __init__(self, users=None, grills_per_user=1, probes=1, latency=0.0, token_ttl=3600, url_ttl=3600,
+                 command_delay=0.2, update_interval=0.0, seed=0, lost_updates=0.0):
+        self.users = users if users is not None else {"bench": "password"}
+        self.latency = latency
+        self.token_ttl = token_ttl
+        self.url_ttl = url_ttl
+        self.command_delay = command_delay
+        self.update_interval = update_interval
+        self.lost_updates = lost_updates
+        self.secret = secrets.token_bytes(16)
+        self.tokens = {}
+        self.refresh_tokens = {}
+        self.subscribers = {}
+        self.stats = dict.fromkeys(("logins", "refreshes", "commands", "urls", "connections", "published", "lost"), 0)
+        rng = self.rng = random.Random(seed)
+        self.grills = {}
+        for username in self.users:
+            for index in range(grills_per_user):
+                thing_name = f"{username}-{index:03d}"
+                self.grills[thing_name] = SimulatedGrill(thing_name, username, probes, rng)
+        self.app = web.Application()
+        self.app.router.add_post("/cognito", self.cognito)
+        self.app.router.add_get("/prod/users/self", self.user_self)
+        self.app.router.add_post("/prod/mqtt-connections", self.mqtt_connections)
+        self.app.router.add_post("/prod/things/{thing_name}/commands", self.command)
+        self.app.router.add_get("/mqtt", self.broker)
+        self.runner = None
+        self.ticker = None
+        self.base_url = None
+
+    @property
+    def api_url(self):
+        return f"{self.base_url}/prod"
+
+    @property
+    def cognito_url(self):
+        return f"{self.base_url}/cognito"
+
+    def grills_of(self, username):
+        return [grill for grill in self.grills.values() if grill.owner == username]
+
+    async def start(self, host="127.0.0.1", port=8080):
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+        self.base_url = f"http://{host}:{port}"
+        if self.update_interval:
+            self.ticker = asyncio.get_running_loop().create_task(self.tick())
+
+    async def stop(self):
+        if self.ticker is not None:
+            self.ticker.cancel()
+        await self.runner.cleanup()
+
+#===========================REST=======================================================================
+    async def delay(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def issue_tokens(self, username, refresh=True):
+        token = secrets.token_urlsafe(24)
+        self.tokens[token] = (username, time.time() + self.token_ttl)
+        result = {
+            "AccessToken": secrets.token_urlsafe(24),
+            "ExpiresIn": self.token_ttl,
+            "IdToken": token,
+            "TokenType": "Bearer",
+        }
+        if refresh:
+            refresh_token = secrets.token_urlsafe(32)
+            self.refresh_tokens[refresh_token] = username
+            result["RefreshToken"] = refresh_token
+        return {"AuthenticationResult": result, "ChallengeParameters": {}}
+
+    async def cognito(self, request):
+        await self.delay()
+        body = json.loads(await request.read())
+        parameters = body.get("AuthParameters", {})
+        if body.get("AuthFlow") == "USER_PASSWORD_AUTH":
+            username = parameters.get("USERNAME")
+            if username in self.users and self.users[username] == parameters.get("PASSWORD"):
+                self.stats["logins"] += 1
+                return web.json_response(self.issue_tokens(username))
+        elif body.get("AuthFlow") == "REFRESH_TOKEN_AUTH":
+            username = self.refresh_tokens.get(parameters.get("REFRESH_TOKEN"))
+            if username is not None:
+                self.stats["refreshes"] += 1
+                return web.json_response(self.issue_tokens(username, refresh=False))
+        return web.json_response(
+            {"__type": "NotAuthorizedException", "message": "Incorrect username or password."}, status=400)
+
+    def authorized(self, request):
+        username, expires = self.tokens.get(request.headers.get("Authorization"), (None, 0))
+        return username if expires > time.time() else None
+
+    async def user_self(self, request):
+        await self.delay()
+        username = self.authorized(request)
+        if username is None:
+            return web.json_response({"message": "Unauthorized"}, status=401)
+        return web.json_response({
+            "username": username,
+            "things": [
+                {"thingName": grill.thing_name, "friendlyName": grill.message["details"]["friendlyName"],
+                 "deviceTypeId": "2204", "status": "CONNECTED"}
+                for grill in self.grills_of(username)
+            ],
+        })
+
+    def signature(self, username, expires):
+        return hmac.new(self.secret, f"{username}:{expires}".encode(), hashlib.sha256).hexdigest()
+
+    async def mqtt_connections(self, request):
+        await self.delay()
+        username = self.authorized(request)
+        if username is None:
+            return web.json_response({"message": "Unauthorized"}, status=401)
+        self.stats["urls"] += 1
+        expires = int(time.time()) + self.url_ttl
+        url = (f"ws://{request.host}/mqtt?X-Amz-User={username}&X-Amz-Expires={expires}"
+               f"&X-Amz-Signature={self.signature(username, expires)}")
+        return web.json_response({"signedUrl": url, "expirationSeconds": self.url_ttl})
+
+    async def command(self, request):
+        await self.delay()
+        username = self.authorized(request)
+        if username is None:
+            return web.json_response({"message": "Unauthorized"}, status=401)
+        grill = self.grills.get(request.match_info["thing_name"])
+        if grill is None or grill.owner != username:
+            return web.json_response({"message": "Forbidden"}, status=403)
+        body = json.loads(await request.read())
+        self.stats["commands"] += 1
+        command = body.get("command", "")
+        if grill.apply(command):
+            if command != "90" and self.rng.random() < self.lost_updates:
+                self.stats["lost"] += 1
+            else:
+                asyncio.get_running_loop().call_later(self.command_delay, self.publish, grill)
+        return web.json_response({})
+
+#===========================MQTT=======================================================================
+    def publish(self, grill):
+        topic = TOPIC_PREFIX + grill.thing_name
+        subscribers = self.subscribers.get(topic)
+        if not subscribers:
+            return
+        packet = build_packet(PUBLISH | 0x02, build_string(topic) + struct.pack("!H", 1) + grill.payload())
+        for ws in list(subscribers):
+            asyncio.get_running_loop().create_task(self.send(ws, packet))
+        self.stats["published"] += 1
+
+    @staticmethod
+    async def send(ws, packet):
+        try:
+            await ws.send_bytes(packet)
+        except ConnectionResetError:
+            pass
+
+    async def tick(self):
+        last = time.monotonic()
+        while True:
+            await asyncio.sleep(self.update_interval)
+            now = time.monotonic()
+            for grill in self.grills.values():
+                if grill.step(now - last):
+                    self.publish(grill)
+            last = now
+
+    async def broker(self, request):
+        username = request.query.get("X-Amz-User", "")
+        try:
+            expires = int(request.query.get("X-Amz-Expires", "0"))
+        except ValueError:
+            expires = 0
+        signature = request.query.get("X-Amz-Signature", "")
+        if expires < time.time() or not hmac.compare_digest(signature, self.signature(username, expires)):
+            raise web.HTTPForbidden(text="Signature expired or invalid")
+        ws = web.WebSocketResponse(protocols=("mqtt",), max_msg_size=0)
+        await ws.prepare(request)
+        self.stats["connections"] += 1
+        reader = PacketReader()
+        topics = []
+        try:
+            async for msg in ws:
+                for header, body in reader.feed(msg.data):
+                    packet_type = header & 0xF0
+                    if packet_type == CONNECT:
+                        await ws.send_bytes(build_packet(CONNACK, b"\x00\x00"))
+                    elif packet_type == SUBSCRIBE:
+                        mid = struct.unpack_from("!H", body)[0]
+                        granted = []
+                        pos = 2
+                        while pos < len(body):
+                            length = struct.unpack_from("!H", body, pos)[0]
+                            topic = bytes(body[pos + 2:pos + 2 + length]).decode("utf-8")
+                            pos += 2 + length + 1
+                            grill = self.grills.get(topic[len(TOPIC_PREFIX):])
+                            if grill is None or grill.owner != username:
+                                granted.append(0x80)
+                                continue
+                            self.subscribers.setdefault(topic, set()).add(ws)
+                            topics.append(topic)
+                            granted.append(1)
+                        await ws.send_bytes(build_packet(SUBACK, struct.pack("!H", mid) + bytes(granted)))
+                    elif packet_type == PINGREQ:
+                        await ws.send_bytes(build_packet(PINGRESP))
+                    elif packet_type == DISCONNECT:
+                        await ws.close()
+        finally:
+            for topic in topics:
+                self.subscribers.get(topic, set()).discard(ws)
+        return ws
+
+
+async def serve(args):
+    users = {f"user{index}": "password" for index in range(args.users)} if args.users > 1 else None
+    cloud = FakeCloud(users, args.grills, args.probes, args.latency, args.token_ttl, args.url_ttl,
+                      args.command_delay, args.update_interval, lost_updates=args.lost_updates)
+    await cloud.start(args.host, args.port)
+    print(f"Traeger cloud stand-in on {cloud.base_url}, users: {', '.join(cloud.users)} (password \"password\")")
+    print(f"api_url={cloud.api_url} cognito_url={cloud.cognito_url}")
+    try:
+        while True:
+            await asyncio.sleep(60)
+            print(cloud.stats)
+    finally:
+        await cloud.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--users", type=int, default=1)
+    parser.add_argument("--grills", type=int, default=1, help="grills per user")
+    parser.add_argument("--probes", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every REST call")
+    parser.add_argument("--token-ttl", type=int, default=3600)
+    parser.add_argument("--url-ttl", type=int, default=3600)
+    parser.add_argument("--command-delay", type=float, default=0.2)
+    parser.add_argument("--update-interval", type=float, default=0.0)
+    parser.add_argument("--lost-updates", type=float, default=0.0, help="fraction of command statuses dropped")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Tiny websocket MQTT broker used by the benchmarks.
+
+Accepts one session at a time, acknowledges CONNECT and SUBSCRIBE, then
+publishes a fixed list of payloads to every subscribed topic, either as
+fast as possible or at a fixed rate.
+"""
+import asyncio
+import struct
+
+from aiohttp import web
+
+from custom_components.traeger.mqtt_async import (
+    CONNACK,
+    CONNECT,
+    DISCONNECT,
+    PINGREQ,
+    PINGRESP,
+    PUBLISH,
+    SUBACK,
+    SUBSCRIBE,
+    PacketReader,
+    build_packet,
+    build_string,
+)
+
+
+class BenchBroker:
+    def __init__(self, payloads, rate=0):
+        self.payloads = payloads
+        self.rate = rate
+
+    async def handle(self, request):
+        ws = web.WebSocketResponse(protocols=("mqtt",), max_msg_size=0)
+        await ws.prepare(request)
+        reader = PacketReader()
+        publishers = []
+        async for msg in ws:
+            for header, body in reader.feed(msg.data):
+                packet_type = header & 0xF0
+                if packet_type == CONNECT:
+                    await ws.send_bytes(build_packet(CONNACK, b"\x00\x00"))
+                elif packet_type == SUBSCRIBE:
+                    mid = struct.unpack_from("!H", body)[0]
+                    topics = []
+                    pos = 2
+                    while pos < len(body):
+                        length = struct.unpack_from("!H", body, pos)[0]
+                        topics.append(body[pos + 2:pos + 2 + length].decode("utf-8"))
+                        pos += 2 + length + 1
+                    await ws.send_bytes(build_packet(SUBACK, struct.pack("!H", mid) + bytes([1] * len(topics))))
+                    for topic in topics:
+                        publishers.append(asyncio.create_task(self.publish(ws, topic)))
+                elif packet_type == PINGREQ:
+                    await ws.send_bytes(build_packet(PINGRESP))
+                elif packet_type == DISCONNECT:
+                    await ws.close()
+        for task in publishers:
+            task.cancel()
+        return ws
+
+    async def publish(self, ws, topic):
+        prefix = build_string(topic)
+        batch = max(1, self.rate // 100) if self.rate else 64
+        mid = 0
+        for start in range(0, len(self.payloads), batch):
+            for payload in self.payloads[start:start + batch]:
+                mid = mid % 0xFFFF + 1
+                try:
+                    await ws.send_bytes(build_packet(PUBLISH | 0x02, prefix + struct.pack("!H", mid) + payload))
+                except ConnectionResetError:                #Client went away mid stream
+                    return
+            await asyncio.sleep(0.01 if self.rate else 0)
+
+
+def run_broker(port, payloads, rate=0):
+    """Serve the broker on ws://127.0.0.1:<port>/mqtt until killed."""
+    broker = BenchBroker(payloads, rate)
+    app = web.Application()
+    app.router.add_get("/mqtt", broker.handle)
+    web.run_app(app, host="127.0.0.1", port=port, print=None, handle_signals=False)
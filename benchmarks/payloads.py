@@ -0,0 +1,109 @@
+"""
+Synthetic Traeger status payloads shaped like the ones the cloud publishes
+on prod/thing/update/<thingName>. Shared by the benchmarks.
+"""
+import json
+import random
+import time
+
+
+def probe_accessory(index, get_temp=120, set_temp=165, connected=1, alarm_fired=0):
+    return {
+        "uuid": f"p{index:02d}",
+        "channel": f"p{index}",
+        "type": "probe",
+        "con": connected,
+        "probe": {
+            "get_temp": get_temp,
+            "set_temp": set_temp,
+            "alarm_fired": alarm_fired,
+        },
+    }
+
+
+def status_payload(thing_name, grill=225, set_temp=225, probes=1, system_status=6, pellet_level=80, units=1):
+    """Return a decoded status message for one grill."""
+    now = int(time.time())
+    return {
+        "thingName": thing_name,
+        "status": {
+            "grill": grill,
+            "set": set_temp,
+            "ambient": 72,
+            "pellet_level": pellet_level,
+            "system_status": system_status,
+            "units": units,
+            "connected": True,
+            "probe_con": 1 if probes else 0,
+            "probe": 120 if probes else 0,
+            "probe_set": 165 if probes else 0,
+            "probe_alarm_fired": 0,
+            "smoke": 0,
+            "keepwarm": 0,
+            "cook_id": "",
+            "cook_timer_start": 0,
+            "cook_timer_end": 0,
+            "cook_timer_complete": 0,
+            "sys_timer_start": 0,
+            "sys_timer_end": 0,
+            "sys_timer_complete": 0,
+            "current_cycle": 0,
+            "current_step": 0,
+            "errors": 0,
+            "server_status": 0,
+            "in_custom": 0,
+            "real_time": 1,
+            "time": now,
+            "acc": [probe_accessory(i) for i in range(probes)],
+        },
+        "details": {
+            "thingName": thing_name,
+            "friendlyName": f"Grill {thing_name}",
+            "deviceType": "2204",
+            "userId": "00000000-0000-0000-0000-000000000000",
+            "lastConnectedOn": now,
+        },
+        "limits": {
+            "max_grill_temp": 500,
+            "max_probe_temp": 215,
+            "max_timer": 86400,
+        },
+        "settings": {
+            "device_type_id": "2204",
+            "fw_version": "01.01.08",
+            "units": units,
+            "speaker": 1,
+            "language": 0,
+            "config_version": "1.0",
+            "rssi": -48,
+            "ssid": "benchmark",
+        },
+        "features": {
+            "pellet_sensor_connected": 1,
+            "super_smoke_enabled": 1,
+            "grill_mode_enabled": 1,
+            "open_loop_mode_enabled": 0,
+            "cold_smoke_enabled": 0,
+        },
+        "usage": {
+            "grill_clean_countdown": 36000,
+            "auger": 180000,
+            "fan": 300000,
+            "hotrod": 20000,
+            "cook_cycles": 120,
+        },
+    }
+
+
+def status_messages(thing_name, count, probes=1, seed=0):
+    """Return encoded payloads with the temperatures drifting like a real cook."""
+    rng = random.Random(seed)
+    grill = 180
+    messages = []
+    for _ in range(count):
+        grill = max(150, min(260, grill + rng.randint(-3, 4)))
+        payload = status_payload(thing_name, grill=grill, probes=probes)
+        for accessory in payload["status"]["acc"]:
+            accessory["probe"]["get_temp"] += rng.randint(0, 40)
+        messages.append(json.dumps(payload).encode("utf-8"))
+    return messages
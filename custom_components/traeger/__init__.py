@@ -12,16 +12,30 @@ from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import Config, HomeAssistant, Event
 from homeassistant.exceptions import ConfigEntryNotReady
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 
+from .reactor import TraegerReactor
 from .traeger import traeger
 
 from .const import (
+    CONF_COMMAND_INTERVAL,
+    CONF_MQTT_TRANSPORT,
+    CONF_OPTIMISTIC_TIMEOUT,
     CONF_PASSWORD,
+    CONF_STALL_THRESHOLD,
     CONF_USERNAME,
+    DEFAULT_COMMAND_INTERVAL,
+    DEFAULT_MQTT_TRANSPORT,
+    DEFAULT_OPTIMISTIC_TIMEOUT,
+    DEFAULT_STALL_THRESHOLD,
     DOMAIN,
+    DOMAIN_DATA,
     PLATFORMS,
     STARTUP_MESSAGE,
+    STORAGE_KEY_AUTH,
+    STORAGE_KEY_STATE,
+    STORAGE_VERSION,
 )
 
 from homeassistant.const import (
@@ -38,6 +52,16 @@ _LOGGER: logging.Logger = logging.getLogger(__package__)
 
 async def async_setup(hass: HomeAssistant, config: Config):
     """Set up this integration using YAML is not supported."""
+    from .views import TraegerMetricsView                   #Needs the http component loaded first
+    hass.http.register_view(TraegerMetricsView)
+
+    async def async_shutdown_reactor(event: Event):
+        """Stop the shared reactor with Home Assistant."""
+        reactor = hass.data.pop(DOMAIN_DATA, None)
+        if reactor is not None:
+            reactor.shutdown()
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_shutdown_reactor)
     return True
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
@@ -48,13 +72,29 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
 
     username = entry.data.get(CONF_USERNAME)
     password = entry.data.get(CONF_PASSWORD)
+    mqtt_transport = entry.options.get(CONF_MQTT_TRANSPORT, DEFAULT_MQTT_TRANSPORT)
+    command_interval = entry.options.get(CONF_COMMAND_INTERVAL, DEFAULT_COMMAND_INTERVAL)
+    optimistic_timeout = entry.options.get(CONF_OPTIMISTIC_TIMEOUT, DEFAULT_OPTIMISTIC_TIMEOUT)
+    stall_threshold = entry.options.get(CONF_STALL_THRESHOLD, DEFAULT_STALL_THRESHOLD)
 
     session = async_get_clientsession(hass)
 
 
-    client = traeger(username, password, hass, session)
+    token_store = Store(hass, STORAGE_VERSION, STORAGE_KEY_AUTH.format(entry.entry_id))
+    state_store = Store(hass, STORAGE_VERSION, STORAGE_KEY_STATE.format(entry.entry_id))
 
-    await client.start(30)
+    reactor = hass.data.get(DOMAIN_DATA)                    #One reactor for all entries
+    if reactor is None:
+        reactor = hass.data[DOMAIN_DATA] = TraegerReactor(hass.loop)
+
+    client = traeger(
+        username, password, hass, session, mqtt_transport, token_store, command_interval, optimistic_timeout,
+        state_store, reactor, stall_threshold=stall_threshold / 1000,
+    )
+
+    await client.load_token()
+    await client.load_state()
+    await client.start(0)
     hass.data[DOMAIN][entry.entry_id] = client
 
     for platform in PLATFORMS:
@@ -66,8 +106,8 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
         """Shut down the client."""
         await client.kill()
 
-    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_shutdown)
-    entry.add_update_listener(async_reload_entry)
+    entry.async_on_unload(hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_shutdown))
+    entry.async_on_unload(entry.add_update_listener(async_reload_entry))
     return True
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
@@ -84,11 +124,20 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     await client.kill()
     if unloaded:
         hass.data[DOMAIN].pop(entry.entry_id)
+    if not hass.data[DOMAIN]:                               #Last entry gone, so is the reactor
+        reactor = hass.data.pop(DOMAIN_DATA, None)
+        if reactor is not None:
+            reactor.shutdown()
 
     return unloaded
 
 
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Forget the persisted tokens and grill state when the entry is deleted."""
+    await Store(hass, STORAGE_VERSION, STORAGE_KEY_AUTH.format(entry.entry_id)).async_remove()
+    await Store(hass, STORAGE_VERSION, STORAGE_KEY_STATE.format(entry.entry_id)).async_remove()
+
+
 async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
     """Reload config entry."""
-    await async_unload_entry(hass, entry)
-    await async_setup_entry(hass, entry)
+    await hass.config_entries.async_reload(entry.entry_id)  #Runs the entry's on_unload callbacks too
@@ -0,0 +1,181 @@
+"""
+Cognito token management for the traeger client.
+"""
+import asyncio
+import logging
+import time
+
+_LOGGER: logging.Logger = logging.getLogger(__package__)
+
+RENEW_AHEAD = 300       # Renew in the background this many seconds before expiry
+EXPIRY_MARGIN = 60      # Tokens closer than this to expiry are not handed out
+RETRY_DELAY = 60        # Retry a failed background renewal after this many seconds
+AUTH_RETRY_DELAY = 300  # Retry after a rejected password no sooner than this many seconds
+
+# Cognito error types meaning the credentials are no good, anything else is worth retrying.
+REFRESH_REJECTED = ("NotAuthorizedException",)
+LOGIN_REJECTED = ("NotAuthorizedException", "UserNotFoundException")
+
+
+class TokenError(Exception):
+    """No token could be had from Cognito."""
+
+
+class TokenRenewError(TokenError):
+    """Cognito could not be reached or failed, the credentials were not the problem."""
+
+
+class TokenAuthError(TokenError):
+    """Cognito rejected the password."""
+
+
+def cognito_error(response):
+    """Error type of a Cognito reply, None when it carries tokens."""
+    if "AuthenticationResult" in response:
+        return None
+    return str(response.get("__type", "unknown")).rsplit("#", 1)[-1]
+
+
+class TokenManager:
+    """Keeps a valid Cognito IdToken cached for the client.
+
+    Tokens are renewed in the background RENEW_AHEAD seconds before they
+    expire, so commands normally get the cached token without waiting.
+    Renewal is single-flight: callers that find the token expired all
+    await the same in-flight renewal instead of each starting their own.
+    Renewal uses the refresh token and falls back to the password only
+    when Cognito rejects it (NotAuthorizedException); a request that fails
+    or any other Cognito error, throttling included, raises TokenRenewError
+    and keeps the refresh token for a later retry. A rejected password
+    raises TokenAuthError. Tokens are persisted in the optional store.
+    Renewal timers go through timers (anything with call_later), the loop
+    unless a shared reactor is passed. Renewal times are recorded in the
+    optional metrics registry.
+    """
+
+    def __init__(self, loop, username, do_cognito, store=None, timers=None, metrics=None):
+        self.loop = loop
+        self.renew_time = None
+        if metrics is not None:
+            self.renew_time = metrics.histogram("token_renew_seconds", "Time to renew the Cognito token")
+        self.timers = timers if timers is not None else loop
+        self.username = username
+        self.do_cognito = do_cognito
+        self.store = store
+        self.token = None
+        self.expires = 0
+        self.refresh_token = None
+        self.renewals = 0
+        self._renewal = None
+        self._timer = None
+
+    def remaining(self):
+        return self.expires - time.time()
+
+    async def async_get_token(self):
+        """Return a token valid for at least EXPIRY_MARGIN seconds."""
+        if self.remaining() < EXPIRY_MARGIN:
+            await self.async_renew()
+        return self.token
+
+    def async_renew(self):
+        """Start a renewal, or join the one in flight."""
+        return asyncio.shield(self._start_renewal())
+
+    def _start_renewal(self):
+        if self._renewal is None:
+            self._renewal = self.loop.create_task(self._renew())
+            self._renewal.add_done_callback(self._renewal_done)
+        return self._renewal
+
+    def start(self):
+        """Schedule background renewal for the current token."""
+        self._schedule(self.remaining() - RENEW_AHEAD)
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    async def async_load(self):
+        """Restore the tokens persisted by a previous run."""
+        if self.store is None:
+            return
+        data = await self.store.async_load()
+        if data is None or data.get("username") != self.username:
+            return
+        self.token = data["id_token"]
+        self.expires = data["expires"]
+        self.refresh_token = data["refresh_token"]
+        _LOGGER.debug(f"Restored token, Token Time Remaining:{self.remaining()}")
+
+    async def _save(self):
+        if self.store is None:
+            return
+        await self.store.async_save({
+            "username": self.username,
+            "id_token": self.token,
+            "refresh_token": self.refresh_token,
+            "expires": self.expires,
+        })
+
+    async def _refresh(self):
+        """Renew with the refresh token, None if Cognito rejected it."""
+        response = await self.do_cognito("REFRESH_TOKEN_AUTH", {
+            "REFRESH_TOKEN": self.refresh_token,
+        })
+        if response is None:                                #Request failed, keep the refresh token
+            raise TokenRenewError("Token refresh request failed")
+        error = cognito_error(response)
+        if error in REFRESH_REJECTED:
+            _LOGGER.info(f"Refresh token rejected, logging in with password. {response}")
+            self.refresh_token = None
+            return None
+        if error is not None:
+            raise TokenRenewError(f"Token refresh failed: {error}")
+        return response
+
+    async def _renew(self):
+        request_time = time.time()
+        started = time.perf_counter()
+        response = None
+        if self.refresh_token is not None:
+            response = await self._refresh()
+        if response is None:
+            response = await self.do_cognito()
+            if response is None:
+                raise TokenRenewError("Password login request failed")
+            error = cognito_error(response)
+            if error in LOGIN_REJECTED:
+                raise TokenAuthError(f"Password login rejected: {response.get('message', error)}")
+            if error is not None:
+                raise TokenRenewError(f"Password login failed: {error}")
+        result = response["AuthenticationResult"]
+        self.expires = result["ExpiresIn"] + request_time
+        self.token = result["IdToken"]
+        if "RefreshToken" in result:                        #Only returned by the password flow
+            self.refresh_token = result["RefreshToken"]
+        self.renewals += 1
+        if self.renew_time is not None:
+            self.renew_time.time(started)
+        _LOGGER.debug(f"Token renewed, Token Time Remaining:{self.remaining()}")
+        await self._save()
+
+    def _renewal_done(self, task):
+        self._renewal = None
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            _LOGGER.warning(f"Token renewal failed: {task.exception()!r}")
+            if self._timer is not None:
+                self._schedule(RETRY_DELAY)
+            return
+        if self._timer is not None:
+            self.start()
+
+    def _schedule(self, delay):
+        self.stop()
+        self._timer = self.timers.call_later(max(delay, 0), self._background_renew)
+
+    def _background_renew(self):
+        self._start_renewal()
@@ -18,15 +18,6 @@ from homeassistant.const import (
 
 from .const import (
     DOMAIN,
-    GRILL_MODE_OFFLINE,
-    GRILL_MODE_COOL_DOWN,
-    GRILL_MODE_CUSTOM_COOK,
-    GRILL_MODE_MANUAL_COOK,
-    GRILL_MODE_PREHEATING,
-    GRILL_MODE_IGNITING,
-    GRILL_MODE_IDLE,
-    GRILL_MODE_SLEEPING,
-    GRILL_MODE_SHUTDOWN,
     GRILL_MIN_TEMP_C,
     GRILL_MIN_TEMP_F,
     PROBE_PRESET_MODES,
@@ -42,7 +33,8 @@ async def async_setup_entry(hass, entry, async_add_devices):
     for grill in grills:
         grill_id = grill["thingName"]
         async_add_devices([TraegerClimateEntity(client, grill_id, "Climate")])
-        TraegerGrillMonitor(client, grill_id, async_add_devices, AccessoryTraegerClimateEntity)
+        monitor = TraegerGrillMonitor(client, grill_id, async_add_devices, AccessoryTraegerClimateEntity)
+        entry.async_on_unload(monitor.unsubscribe)
 
 
 class TraegerBaseClimate(ClimateEntity, TraegerBaseEntity):
@@ -54,10 +46,7 @@ class TraegerBaseClimate(ClimateEntity, TraegerBaseEntity):
     @property
     def name(self):
         """Return the name of the grill"""
-        if self.grill_details is None:
-            return f"{self.grill_id} {self.friendly_name}"
-        name = self.grill_details["friendlyName"]
-        return f"{name} {self.friendly_name}"
+        return self.grill_entity_name(self.friendly_name)
 
     # Climate Properties
     @property
@@ -80,6 +69,8 @@ class TraegerBaseClimate(ClimateEntity, TraegerBaseEntity):
 class TraegerClimateEntity(TraegerBaseClimate):
     """Climate entity for Traeger grills"""
 
+    grill_fields = ("grill", "set", "system_status", "limits")
+
     def __init__(self, client, grill_id, friendly_name):
         super().__init__(client, grill_id, friendly_name)
         self.grill_register_callback()
@@ -95,10 +86,9 @@ class TraegerClimateEntity(TraegerBaseClimate):
     @property
     def available(self):
         """Reports unavailable when the grill is powered off"""
-        if self.grill_state is None:
+        if self.grill_snapshot is None:
             return False
-        else:
-            return self.grill_state["connected"]
+        return self.grill_snapshot.connected
 
     # Climate Properties
     @property
@@ -131,31 +121,9 @@ class TraegerClimateEntity(TraegerBaseClimate):
         """Return hvac operation ie. heat, cool mode.
         Need to be one of HVAC_MODE_*.
         """
-        if self.grill_state is None:
-            return HVAC_MODE_OFF
-
-        state = self.grill_state["system_status"]
-
-        if state == GRILL_MODE_COOL_DOWN:
-            return HVAC_MODE_COOL
-        elif state == GRILL_MODE_CUSTOM_COOK:
-            return HVAC_MODE_HEAT
-        elif state == GRILL_MODE_MANUAL_COOK:
-            return HVAC_MODE_HEAT
-        elif state == GRILL_MODE_PREHEATING:
-            return HVAC_MODE_HEAT
-        elif state == GRILL_MODE_IGNITING:
-            return HVAC_MODE_HEAT
-        elif state == GRILL_MODE_IDLE:
-            return HVAC_MODE_OFF
-        elif state == GRILL_MODE_SLEEPING:
-            return HVAC_MODE_OFF
-        elif state == GRILL_MODE_OFFLINE:
-            return HVAC_MODE_OFF
-        elif state == GRILL_MODE_SHUTDOWN:
-            return HVAC_MODE_OFF
-        else:
+        if self.grill_snapshot is None:
             return HVAC_MODE_OFF
+        return self.grill_snapshot.hvac_mode
 
     @property
     def hvac_modes(self):
@@ -179,30 +147,21 @@ class TraegerClimateEntity(TraegerBaseClimate):
 class AccessoryTraegerClimateEntity(TraegerBaseClimate):
     """Climate entity for Traeger grills"""
 
+    grill_fields = ("acc", "probe_con")
+
     def __init__(self, client, grill_id, sensor_id):
-        super().__init__(client, grill_id, f"Probe {sensor_id}")
         self.sensor_id = sensor_id
-        self.grill_accessory = self.client.get_details_for_accessory(
-            self.grill_id, self.sensor_id
-        )
+        super().__init__(client, grill_id, f"Probe {sensor_id}")
         self.current_preset_mode = PRESET_NONE
+        self.grill_register_callback()
 
-        # Tell the Traeger client to call grill_accessory_update() when it gets an update
-        self.client.set_callback_for_grill(self.grill_id, self.grill_accessory_update)
-
-    def grill_accessory_update(self):
-        """This gets called when the grill has an update. Update state variable"""
-        self.grill_refresh_state()
+    def grill_refresh_state(self):
+        """Refresh the accessory along with the grill state"""
+        super().grill_refresh_state()
         self.grill_accessory = self.client.get_details_for_accessory(
             self.grill_id, self.sensor_id
         )
 
-        if self.hass is None:
-            return
-
-        # Tell HA we have an update
-        self.schedule_update_ha_state()
-
     # Generic Properties
     @property
     def available(self):
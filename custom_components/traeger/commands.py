@@ -0,0 +1,298 @@
+"""
+Per grill command scheduling for the traeger client.
+"""
+import asyncio
+import itertools
+import logging
+import time
+
+from .optimistic import command_expectations, get_path
+
+_LOGGER: logging.Logger = logging.getLogger(__package__)
+
+CONFIRM_TIMEOUT = 10    # Seconds to wait for a status before asking for one, and again before giving up
+
+# Outcomes of a tracked command
+COMMAND_CONFIRMED = "confirmed"     # A status showed the change
+COMMAND_SUPERSEDED = "superseded"   # A newer command of the same kind replaced it
+COMMAND_FAILED = "failed"           # The cloud did not take the command
+COMMAND_TIMEOUT = "timeout"         # No matching status, even after a refresh
+
+# Names for the command codes in metrics.
+COMMAND_NAMES = {
+    "11": "set_temperature",
+    "12": "set_timer",
+    "14": "set_probe_temperature",
+    "17": "shutdown",
+    "18": "keepwarm",
+    "20": "smoke",
+    "90": "refresh",
+}
+
+# Commands that set the same thing as another code, so either supersedes the other.
+COMMAND_KINDS = {
+    "19": "18",     # Keep warm off / on
+    "21": "20",     # Super smoke off / on
+}
+
+
+def command_kind(command):
+    """Commands of the same kind supersede each other, e.g. "11,225" and "11,250"."""
+    code = command.split(",", 1)[0]
+    return COMMAND_KINDS.get(code, code)
+
+
+class PendingCommand:
+    """A queued command and everyone waiting for it to be sent."""
+
+    __slots__ = ("command", "waiters", "enqueued")
+
+    def __init__(self, command, enqueued):
+        self.command = command
+        self.waiters = []
+        self.enqueued = enqueued
+
+
+class CommandQueue:
+    """Sends one grill's commands in order, at most one per min_interval.
+
+    A command that has not been sent yet is replaced by a newer command of
+    the same kind, so dragging a slider sends the last value instead of
+    every step. The replacement goes to the back of the queue, behind
+    commands issued before it. Callers await send(), which resolves once
+    the command that superseded theirs (or theirs) has been posted.
+    """
+
+    def __init__(self, loop, grill_id, sender, min_interval=0.0):
+        self.loop = loop
+        self.grill_id = grill_id
+        self.sender = sender
+        self.min_interval = min_interval
+        self.pending = {}
+        self.current = None                                 #Being posted, out of pending
+        self.task = None
+        self.last_sent = 0.0
+        self.sent = 0
+        self.coalesced = 0
+        self.latency_last = 0.0
+        self.latency_max = 0.0
+
+    def depth(self):
+        return len(self.pending)
+
+    def stats(self):
+        return {
+            "depth": self.depth(),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "latency_last": self.latency_last,
+            "latency_max": self.latency_max,
+        }
+
+    async def send(self, command):
+        kind = command_kind(command)
+        pending = self.pending.get(kind)
+        if pending is None:
+            pending = self.pending[kind] = PendingCommand(command, time.monotonic())
+        else:
+            _LOGGER.debug(f"Command {pending.command} for {self.grill_id} superseded by {command}")
+            del self.pending[kind]                          #Queued behind the commands sent before it
+            self.pending[kind] = pending
+            pending.command = command
+            self.coalesced += 1
+        waiter = self.loop.create_future()
+        pending.waiters.append(waiter)
+        if self.task is None or self.task.done():
+            self.task = self.loop.create_task(self._run())
+        await waiter
+
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        cancelled = list(self.pending.values())
+        if self.current is not None:
+            cancelled.append(self.current)
+            self.current = None
+        for pending in cancelled:
+            for waiter in pending.waiters:
+                if not waiter.done():
+                    waiter.cancel()
+        self.pending.clear()
+
+    async def _run(self):
+        while self.pending:
+            wait = self.last_sent + self.min_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            pending = self.current = self.pending.pop(next(iter(self.pending)))
+            self.last_sent = time.monotonic()
+            try:
+                await self.sender(self.grill_id, pending.command)
+            except Exception as exception:  # pylint: disable=broad-except
+                for waiter in pending.waiters:
+                    if not waiter.done():
+                        waiter.set_exception(exception)
+                continue
+            finally:
+                self.current = None
+            self.sent += 1
+            self.latency_last = time.monotonic() - pending.enqueued
+            self.latency_max = max(self.latency_max, self.latency_last)
+            for waiter in pending.waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+
+
+class TrackedCommand:
+    """One command from send_command until a status confirms it.
+
+    Await it for the outcome, one of the COMMAND_* values. Commands with
+    nothing to check in the status (shutdown, refresh) are confirmed by the
+    next status the grill sends once the command is on its way.
+    """
+
+    __slots__ = ("id", "grill_id", "command", "kind", "expectations", "sent", "refreshed", "timer", "future",
+                 "latency")
+
+    def __init__(self, command_id, grill_id, command, snapshot, future):
+        self.id = command_id
+        self.grill_id = grill_id
+        self.command = command
+        self.kind = command_kind(command)
+        self.expectations = {}
+        if snapshot is not None:
+            self.expectations = {
+                path: (expected, get_path(snapshot, path))
+                for path, expected in command_expectations(command, snapshot.status).items()
+            }
+        self.sent = None
+        self.refreshed = False
+        self.timer = None
+        self.future = future
+        self.latency = None
+
+    def __await__(self):
+        return asyncio.shield(self.future).__await__()
+
+    def done(self):
+        return self.future.done()
+
+    def outcome(self):
+        return self.future.result() if self.future.done() and not self.future.cancelled() else None
+
+    def matches(self, snapshot):
+        """True once the snapshot's status shows the command applied.
+
+        Like the optimistic overlay, a path counts as applied once it holds the
+        expected value or anything other than its value before the command.
+        """
+        for path, (expected, baseline) in self.expectations.items():
+            actual = get_path(snapshot, path)
+            if actual != expected and actual == baseline:
+                return False
+        return True
+
+
+class CommandTracker:
+    """Follows every command until a grill status confirms it.
+
+    Commands get an id and the status values they should lead to. They are
+    resolved by grill updates, superseded by newer commands of the same kind,
+    failed when the cloud rejects them, and otherwise, after confirm_timeout,
+    the grill is asked for its status once ("90") before they time out.
+    Round trips (sent to confirmed) are recorded per command type in the
+    optional metrics registry.
+    """
+
+    def __init__(self, loop, refresh, timers=None, metrics=None, confirm_timeout=CONFIRM_TIMEOUT):
+        self.loop = loop
+        self.refresh = refresh
+        self.timers = timers if timers is not None else loop
+        self.confirm_timeout = confirm_timeout
+        self.ids = itertools.count(1)
+        self.pending = {}                                   #grill_id: {kind: TrackedCommand}
+        self.roundtrip = None
+        self.outcomes = None
+        if metrics is not None:
+            self.roundtrip = metrics.histogram("command_roundtrip_seconds",
+                                               "Time from sending a command to a status showing it", label="command")
+            self.outcomes = metrics.counter("commands", "Commands by outcome", "result")
+
+    def track(self, grill_id, command, snapshot):
+        """Start tracking a command, snapshot is the confirmed grill state it is sent against."""
+        tracked = TrackedCommand(next(self.ids), grill_id, command, snapshot, self.loop.create_future())
+        pending = self.pending.setdefault(grill_id, {})
+        previous = pending.get(tracked.kind)
+        if previous is not None:
+            self._resolve(previous, COMMAND_SUPERSEDED)
+        pending[tracked.kind] = tracked
+        return tracked
+
+    def get(self, grill_id, command):
+        tracked = self.pending.get(grill_id, {}).get(command_kind(command))
+        if tracked is None or tracked.command != command:
+            return None
+        return tracked
+
+    def sending(self, grill_id, command):
+        """The command is being posted, statuses from now on may confirm it."""
+        tracked = self.get(grill_id, command)
+        if tracked is not None and tracked.sent is None:
+            tracked.sent = time.monotonic()
+        return tracked
+
+    def sent(self, tracked, ok):
+        if tracked is None or tracked.done():
+            return
+        if not ok:
+            self._resolve(tracked, COMMAND_FAILED)
+            return
+        tracked.timer = self.timers.call_later(self.confirm_timeout, self._expired, tracked)
+
+    def status_update(self, grill_id, snapshot):
+        """Resolve the commands of grill_id that snapshot confirms."""
+        pending = self.pending.get(grill_id)
+        if not pending:
+            return
+        for tracked in list(pending.values()):
+            if tracked.sent is not None and tracked.matches(snapshot):
+                self._resolve(tracked, COMMAND_CONFIRMED)
+
+    def cancel(self):
+        for pending in self.pending.values():
+            for tracked in pending.values():
+                if tracked.timer is not None:
+                    tracked.timer.cancel()
+                tracked.future.cancel()
+        self.pending.clear()
+
+    def _expired(self, tracked):
+        tracked.timer = None
+        if tracked.done():
+            return
+        if tracked.refreshed or tracked.kind == "90":
+            _LOGGER.warning(f"Command {tracked.command} for {tracked.grill_id} was not confirmed")
+            self._resolve(tracked, COMMAND_TIMEOUT)
+            return
+        tracked.refreshed = True
+        _LOGGER.debug(f"Command {tracked.command} for {tracked.grill_id} not confirmed yet, asking for status")
+        if "90" not in self.pending.get(tracked.grill_id, {}):
+            self.refresh(tracked.grill_id)
+        tracked.timer = self.timers.call_later(self.confirm_timeout, self._expired, tracked)
+
+    def _resolve(self, tracked, outcome):
+        pending = self.pending.get(tracked.grill_id)
+        if pending is not None and pending.get(tracked.kind) is tracked:
+            del pending[tracked.kind]
+        if tracked.timer is not None:
+            tracked.timer.cancel()
+            tracked.timer = None
+        if outcome == COMMAND_CONFIRMED:
+            tracked.latency = time.monotonic() - tracked.sent
+            if self.roundtrip is not None:
+                self.roundtrip.observe(COMMAND_NAMES.get(tracked.kind, tracked.kind), tracked.latency)
+        if self.outcomes is not None:
+            self.outcomes.inc(outcome)
+        if not tracked.future.done():
+            tracked.future.set_result(outcome)
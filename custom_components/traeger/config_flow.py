@@ -8,9 +8,18 @@ import logging
 from .traeger import traeger
 
 from .const import (
+    CONF_COMMAND_INTERVAL,
+    CONF_MQTT_TRANSPORT,
+    CONF_OPTIMISTIC_TIMEOUT,
     CONF_PASSWORD,
+    CONF_STALL_THRESHOLD,
     CONF_USERNAME,
+    DEFAULT_COMMAND_INTERVAL,
+    DEFAULT_MQTT_TRANSPORT,
+    DEFAULT_OPTIMISTIC_TIMEOUT,
+    DEFAULT_STALL_THRESHOLD,
     DOMAIN,
+    MQTT_TRANSPORTS,
     PLATFORMS,
 )
 
@@ -110,8 +119,26 @@ class BlueprintOptionsFlowHandler(config_entries.OptionsFlow):
             step_id="user",
             data_schema=vol.Schema(
                 {
-                    vol.Required(x, default=self.options.get(x, True)): bool
-                    for x in sorted(PLATFORMS)
+                    **{
+                        vol.Required(x, default=self.options.get(x, True)): bool
+                        for x in sorted(PLATFORMS)
+                    },
+                    vol.Required(
+                        CONF_MQTT_TRANSPORT,
+                        default=self.options.get(CONF_MQTT_TRANSPORT, DEFAULT_MQTT_TRANSPORT),
+                    ): vol.In(MQTT_TRANSPORTS),
+                    vol.Required(
+                        CONF_COMMAND_INTERVAL,
+                        default=self.options.get(CONF_COMMAND_INTERVAL, DEFAULT_COMMAND_INTERVAL),
+                    ): vol.All(vol.Coerce(float), vol.Range(min=0, max=10)),
+                    vol.Required(
+                        CONF_OPTIMISTIC_TIMEOUT,
+                        default=self.options.get(CONF_OPTIMISTIC_TIMEOUT, DEFAULT_OPTIMISTIC_TIMEOUT),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=0, max=300)),
+                    vol.Required(
+                        CONF_STALL_THRESHOLD,
+                        default=self.options.get(CONF_STALL_THRESHOLD, DEFAULT_STALL_THRESHOLD),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=0, max=10000)),
                 }
             ),
         )
@@ -1,3 +1,7 @@
+from homeassistant.components.climate.const import (
+    HVAC_MODE_COOL,
+    HVAC_MODE_HEAT,
+)
 from homeassistant.const import (
     TEMP_CELSIUS,
     TEMP_FAHRENHEIT,
@@ -12,6 +16,12 @@ VERSION = "0.1.0"
 ATTRIBUTION = ""
 ISSUE_URL = "https://github.com/sebirdman/hass_traeger/issues"
 
+# Storage
+STORAGE_VERSION = 1
+STORAGE_KEY_AUTH = f"{DOMAIN}.{{}}.auth"
+STORAGE_KEY_STATE = f"{DOMAIN}.{{}}.state"
+STATE_SAVE_DELAY = 30               # Seconds from a grill state change to its write, changes meanwhile go in the same write
+
 # Icons
 ICON = "mdi:format-quote-close"
 
@@ -26,9 +36,22 @@ PLATFORMS = [CLIMATE, SENSOR, SWITCH, NUMBER]
 CONF_ENABLED = "enabled"
 CONF_USERNAME = "username"
 CONF_PASSWORD = "password"
+CONF_MQTT_TRANSPORT = "mqtt_transport"
+CONF_COMMAND_INTERVAL = "command_interval"
+CONF_OPTIMISTIC_TIMEOUT = "optimistic_timeout"
+CONF_STALL_THRESHOLD = "stall_threshold"
+
+# MQTT Transports
+MQTT_TRANSPORT_PAHO = "paho"        # paho client looping in its own thread
+MQTT_TRANSPORT_ASYNCIO = "asyncio"  # websocket session on the event loop
+MQTT_TRANSPORTS = [MQTT_TRANSPORT_PAHO, MQTT_TRANSPORT_ASYNCIO]
 
 # Defaults
 DEFAULT_NAME = DOMAIN
+DEFAULT_MQTT_TRANSPORT = MQTT_TRANSPORT_PAHO
+DEFAULT_COMMAND_INTERVAL = 0.5      # Minimum seconds between commands to one grill
+DEFAULT_OPTIMISTIC_TIMEOUT = 15     # Seconds to show a commanded value before rolling back, 0 disables
+DEFAULT_STALL_THRESHOLD = 0         # Milliseconds on the event loop that count as a stall, 0 disables the watchdog
 
 # Grill Modes
 GRILL_MODE_OFFLINE = 99     # Offline
@@ -41,6 +64,29 @@ GRILL_MODE_IGNITING = 4     # Igniting
 GRILL_MODE_IDLE = 3         # Idle (Power switch on, screen on)
 GRILL_MODE_SLEEPING = 2     # Sleeping (Power switch on, screen off)
 
+# Grill State sensor values per grill mode, these correlate with the Traeger application.
+# Modes not listed are reported as "unknown", likely a new state we don't know about.
+GRILL_MODE_STATES = {
+    GRILL_MODE_COOL_DOWN: "cool_down",
+    GRILL_MODE_CUSTOM_COOK: "cook_custom",
+    GRILL_MODE_MANUAL_COOK: "cook_manual",
+    GRILL_MODE_PREHEATING: "preheating",
+    GRILL_MODE_IGNITING: "igniting",
+    GRILL_MODE_IDLE: "idle",
+    GRILL_MODE_SLEEPING: "sleeping",
+    GRILL_MODE_OFFLINE: "offline",
+    GRILL_MODE_SHUTDOWN: "shutdown",
+}
+
+# Climate hvac mode per grill mode, modes not listed are off.
+GRILL_MODE_HVAC_MODES = {
+    GRILL_MODE_COOL_DOWN: HVAC_MODE_COOL,
+    GRILL_MODE_CUSTOM_COOK: HVAC_MODE_HEAT,
+    GRILL_MODE_MANUAL_COOK: HVAC_MODE_HEAT,
+    GRILL_MODE_PREHEATING: HVAC_MODE_HEAT,
+    GRILL_MODE_IGNITING: HVAC_MODE_HEAT,
+}
+
 # Grill Temps
 # these are the min temps the traeger app would set
 GRILL_MIN_TEMP_C = 75
@@ -0,0 +1,28 @@
+"""
+JSON decoding for MQTT and REST payloads.
+
+Uses orjson when it is installed and falls back to the standard library.
+Both backends accept bytes straight from the transport; memoryviews are
+passed through to orjson untouched and only copied for stdlib json.
+"""
+import json
+
+
+def _json_loads(data):
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+
+DECODERS = {"json": _json_loads}
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+else:
+    DECODERS["orjson"] = orjson.loads
+
+DECODER = "orjson" if orjson is not None else "json"
+
+loads = DECODERS[DECODER]
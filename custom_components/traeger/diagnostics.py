@@ -0,0 +1,25 @@
+"""Diagnostics support for Traeger."""
+from homeassistant.components.diagnostics import async_redact_data
+
+from .const import CONF_PASSWORD, CONF_USERNAME, DOMAIN
+
+TO_REDACT = {CONF_USERNAME, CONF_PASSWORD}
+
+
+async def async_get_config_entry_diagnostics(hass, entry):
+    """Client metrics, event loop stalls, and the history and command stats of each grill."""
+    client = hass.data[DOMAIN][entry.entry_id]
+    grills = {}
+    for grill in client.get_grills():
+        grill_id = grill["thingName"]
+        history = client.get_history_for_device(grill_id)
+        grills[grill_id] = {
+            "history": None if history is None else history.summary(),
+            "commands": client.get_command_stats(grill_id),
+        }
+    return {
+        "entry": async_redact_data(entry.as_dict(), TO_REDACT),
+        "metrics": client.metrics.as_dict(),
+        "loop_stalls": None if client.watchdog is None else client.watchdog.report(),
+        "grills": grills,
+    }
@@ -1,10 +1,19 @@
 """TraegerBaseEntity class"""
+from homeassistant.const import TEMP_FAHRENHEIT
 from homeassistant.helpers.entity import Entity
 
 from .const import DOMAIN, NAME, VERSION, ATTRIBUTION
 
+# Fields every entity reads for availability, naming and device info.
+GRILL_BASE_FIELDS = ("connected", "units", "details", "settings")
+
+
 class TraegerBaseEntity(Entity):
 
+    # Status keys or message sections (details, limits, settings, features)
+    # this entity reads. None wakes the entity on every update.
+    grill_fields = None
+
     def __init__(self, client, grill_id):
         super().__init__()
         self.grill_id = grill_id
@@ -12,17 +21,46 @@ class TraegerBaseEntity(Entity):
         self.grill_refresh_state()
 
     def grill_refresh_state(self):
-        self.grill_state = self.client.get_state_for_device(self.grill_id)
-        self.grill_units = self.client.get_units_for_device(self.grill_id)
-        self.grill_details = self.client.get_details_for_device(self.grill_id)
-        self.grill_features = self.client.get_features_for_device(self.grill_id)
-        self.grill_settings = self.client.get_settings_for_device(self.grill_id)
-        self.grill_limits = self.client.get_limits_for_device(self.grill_id)
-        self.grill_cloudconnect = self.client.get_cloudconnect(self.grill_id)
+        # One snapshot lookup, its derived values are shared by every entity of the grill.
+        snapshot = self.client.get_snapshot_for_device(self.grill_id)
+        self.grill_snapshot = snapshot
+        if snapshot is None:
+            self.grill_state = None
+            self.grill_units = TEMP_FAHRENHEIT
+            self.grill_details = None
+            self.grill_features = None
+            self.grill_settings = None
+            self.grill_limits = None
+            self.grill_cloudconnect = False
+        else:
+            self.grill_state = snapshot.status
+            self.grill_units = snapshot.units
+            self.grill_details = snapshot.details
+            self.grill_features = snapshot.features
+            self.grill_settings = snapshot.settings
+            self.grill_limits = snapshot.limits
+            self.grill_cloudconnect = self.client.get_cloudconnect(self.grill_id)
+
+    def grill_entity_name(self, suffix):
+        """Name the entity after the grill's friendly name, or its id before the first update."""
+        if self.grill_snapshot is None:
+            return f"{self.grill_id} {suffix}"
+        return f"{self.grill_snapshot.friendly_name} {suffix}"
 
     def grill_register_callback(self):
-        # Tell the Traeger client to call grill_update() when it gets an update
-        self.client.set_callback_for_grill(self.grill_id, self.grill_update_internal)
+        # Tell the Traeger client to call grill_update() when it gets an update,
+        # until the entity is removed from Home Assistant.
+        self.async_on_remove(
+            self.client.set_callback_for_grill(
+                self.grill_id, self.grill_update_internal, self.grill_watched_fields(), weak=True
+            )
+        )
+
+    def grill_watched_fields(self):
+        """Fields whose changes should refresh this entity."""
+        if self.grill_fields is None:
+            return None
+        return GRILL_BASE_FIELDS + tuple(self.grill_fields)
 
     def grill_update_internal(self):
         self.grill_refresh_state()
@@ -31,7 +69,7 @@ class TraegerBaseEntity(Entity):
             return
 
         # Tell HA we have an update
-        self.schedule_update_ha_state()
+        self.async_write_ha_state()
 
     @property
     def unique_id(self):
@@ -54,7 +92,7 @@ class TraegerBaseEntity(Entity):
 
         return {
             "identifiers": {(DOMAIN, self.grill_id)},
-            "name": self.grill_details["friendlyName"],
+            "name": self.grill_snapshot.friendly_name,
             "model": self.grill_settings["device_type_id"],
             "sw_version": self.grill_settings["fw_version"],
             "manufacturer": NAME
@@ -78,7 +116,9 @@ class TraegerGrillMonitor:
 
         self.device_state = self.client.get_state_for_device(self.grill_id)
         self.grill_add_accessories()
-        self.client.set_callback_for_grill(self.grill_id, self.grill_monitor_internal)
+        self.unsubscribe = self.client.set_callback_for_grill(
+            self.grill_id, self.grill_monitor_internal, ("acc",)
+        )
 
     def grill_monitor_internal(self):
         self.device_state = self.client.get_state_for_device(self.grill_id)
@@ -0,0 +1,257 @@
+"""
+Streaming estimators fed from grill messages at ingest.
+
+Each keeps exponentially weighted running sums instead of a sample window:
+an update shifts the sums to the new sample's time, decays them and adds the
+sample, so its cost does not depend on how much history it covers.
+"""
+import math
+
+from homeassistant.const import TEMP_CELSIUS, TEMP_FAHRENHEIT
+
+from .const import (
+    GRILL_MODE_COOL_DOWN,
+    GRILL_MODE_CUSTOM_COOK,
+    GRILL_MODE_IGNITING,
+    GRILL_MODE_MANUAL_COOK,
+    GRILL_MODE_PREHEATING,
+)
+
+PROBE_TAU = 600             # Seconds, weight of a probe sample falls to 1/e after this
+PROBE_MIN_SPAN = 180        # Seconds of samples before a rate is trusted
+PROBE_RESET_GAP = 900       # Start over after a gap this long between samples
+
+# The stall: evaporative cooling holds large cuts at a plateau in this band.
+STALL_BAND = {
+    TEMP_FAHRENHEIT: (145, 180),
+    TEMP_CELSIUS: (63, 82),
+}
+STALL_RATE = {              # Degrees per hour under which a probe in the band is stalled
+    TEMP_FAHRENHEIT: 4,
+    TEMP_CELSIUS: 2,
+}
+STALL_FRACTION = 0.3        # Or whose heating constant fell below this share of the one before the band
+STALL_DURATION = 7200       # Seconds a stall is expected to last
+STALL_MIN_REMAINING = 900   # Seconds still expected for a stall that outlasted STALL_DURATION
+
+PELLET_TAU = 1800           # Seconds, the level sensor is coarse so its trend is smoothed over half an hour
+PELLET_MIN_SPAN = 1800      # Seconds in one condition before its burn rate is measured
+PELLET_REFILL = 10          # A rise of this many percent is a refill
+PELLET_BUCKET = {           # Set temperatures within one bucket share a burn rate
+    TEMP_FAHRENHEIT: 25,
+    TEMP_CELSIUS: 15,
+}
+# Modes that burn pellets.
+PELLET_BURN_MODES = (
+    GRILL_MODE_IGNITING,
+    GRILL_MODE_PREHEATING,
+    GRILL_MODE_MANUAL_COOK,
+    GRILL_MODE_CUSTOM_COOK,
+    GRILL_MODE_COOL_DOWN,
+)
+
+
+class WeightedTrend:
+    """Exponentially weighted linear regression of a value over time.
+
+    Times are kept relative to the newest sample, so the sums never grow
+    with the absolute time and stay well conditioned.
+    """
+
+    __slots__ = ("tau", "last", "first", "w", "wt", "wy", "wtt", "wty")
+
+    def __init__(self, tau):
+        self.tau = tau
+        self.reset()
+
+    def reset(self):
+        self.last = None
+        self.first = None
+        self.w = self.wt = self.wy = self.wtt = self.wty = 0.0
+
+    def add(self, now, value):
+        if self.last is None:
+            self.first = now
+        else:
+            shift = now - self.last                         #Old sample times become t - shift
+            decay = math.exp(-shift / self.tau)
+            self.wtt = (self.wtt - 2 * shift * self.wt + shift * shift * self.w) * decay
+            self.wty = (self.wty - shift * self.wy) * decay
+            self.wt = (self.wt - shift * self.w) * decay
+            self.w *= decay
+            self.wy *= decay
+        self.last = now
+        self.w += 1
+        self.wy += value
+
+    def span(self):
+        return 0 if self.last is None else self.last - self.first
+
+    def mean(self):
+        return self.wy / self.w if self.w else None
+
+    def slope(self):
+        """Change per second, None until there are two distinct times."""
+        denominator = self.w * self.wtt - self.wt * self.wt
+        if denominator <= 1e-9:
+            return None
+        return (self.w * self.wty - self.wt * self.wy) / denominator
+
+
+class ProbeEstimator:
+    """Time until a probe reaches its set temperature.
+
+    The probe's rate of rise comes from a weighted regression over the last
+    PROBE_TAU or so seconds. The probe heats like a body in an oven, its rate
+    proportional to how far it is below the grill (Newton), so the rate is
+    turned into a heating constant k = rate / (grill - probe) and the
+    estimate follows the curve that slows down near the grill temperature:
+
+        eta = ln((grill - probe) / (grill - target)) / k
+
+    A probe in the STALL_BAND rising slower than STALL_RATE, or with k down
+    to STALL_FRACTION of the k measured below the band, is stalled: the
+    estimate is the expected rest of the stall plus the climb afterwards at
+    the k from below the band.
+    """
+
+    __slots__ = ("probe", "gap", "units", "rate", "k", "k_before", "stall_started", "eta")
+
+    def __init__(self, units=TEMP_FAHRENHEIT):
+        self.probe = WeightedTrend(PROBE_TAU)
+        self.gap = WeightedTrend(PROBE_TAU)
+        self.units = units
+        self.rate = None
+        self.k = None
+        self.k_before = None
+        self.stall_started = None
+        self.eta = None
+
+    def reset(self):
+        self.probe.reset()
+        self.gap.reset()
+        self.rate = self.k = self.k_before = self.stall_started = self.eta = None
+
+    @property
+    def stalled(self):
+        return self.stall_started is not None
+
+    def update(self, now, probe_temp, grill_temp, target, units):
+        """Add one sample and recompute eta, in seconds or None when unknown."""
+        if units != self.units or (self.probe.last is not None and now - self.probe.last > PROBE_RESET_GAP):
+            self.units = units
+            self.reset()
+        if self.probe.last is not None and now <= self.probe.last:
+            return self.eta
+        self.probe.add(now, probe_temp)
+        self.gap.add(now, grill_temp - probe_temp)
+        self.rate = self.probe.slope() if self.probe.span() >= PROBE_MIN_SPAN else None
+        gap = self.gap.mean()
+        self.k = self.rate / gap if self.rate is not None and self.rate > 0 and gap > 1 else None
+        self._update_stall(now, probe_temp)
+        self.eta = self._estimate(now, probe_temp, probe_temp + gap, target)     #Grill smoothed over its swings
+        return self.eta
+
+    def _update_stall(self, now, probe_temp):
+        if self.rate is None:
+            return
+        low, high = STALL_BAND[self.units]
+        if probe_temp < low:
+            if self.k is not None:
+                self.k_before = self.k
+            self.stall_started = None
+            return
+        stalling = (probe_temp <= high and self.k_before is not None
+                    and (self.rate * 3600 < STALL_RATE[self.units]
+                         or self.k is None or self.k < self.k_before * STALL_FRACTION))
+        if not stalling:
+            self.stall_started = None
+        elif self.stall_started is None:
+            self.stall_started = now
+
+    def _estimate(self, now, probe_temp, grill_temp, target):
+        if not target:
+            return None
+        if probe_temp >= target:
+            return 0
+        if self.stalled:
+            remaining = max(STALL_DURATION - (now - self.stall_started), STALL_MIN_REMAINING)
+            climb = self._climb(probe_temp, grill_temp, target, self.k_before)
+            return None if climb is None else remaining + climb
+        if self.k is None:
+            return None
+        return self._climb(probe_temp, grill_temp, target, self.k)
+
+    @staticmethod
+    def _climb(probe_temp, grill_temp, target, k):
+        if k is None or grill_temp <= target:               #Never gets there at this grill temperature
+            return None
+        return math.log((grill_temp - probe_temp) / (grill_temp - target)) / k
+
+
+class PelletEstimator:
+    """Pellet burn rate and time until the hopper is empty, for one grill.
+
+    The burn rate depends on what the grill is doing, so it is learned per
+    condition: the system_status and the set temperature, in PELLET_BUCKET
+    steps. While one condition holds, the trend of the (noisy, coarse) level
+    is tracked with a weighted regression; once it covers PELLET_MIN_SPAN it
+    becomes that condition's learned rate, blended with what was learned
+    before (prior) at first and fully trusted after another PELLET_TAU or so.
+    The time to empty uses the learned rate of the current condition, or of
+    the nearest set temperature in the same mode before that one is learned.
+    Refills restart the trend. rates is a dict that can be persisted.
+    """
+
+    __slots__ = ("trend", "units", "condition", "prior", "rates", "rate", "level", "empty_in")
+
+    def __init__(self, units=TEMP_FAHRENHEIT, rates=None):
+        self.trend = WeightedTrend(PELLET_TAU)
+        self.units = units
+        self.condition = None
+        self.prior = None
+        self.rates = rates if rates is not None else {}    #(system_status, bucket): percent per hour
+        self.rate = None
+        self.level = None
+        self.empty_in = None
+
+    def update(self, now, level, set_temp, system_status, units):
+        """Add one sample and recompute empty_in, in seconds or None when not burning or unknown."""
+        if units != self.units:                             #Buckets changed size
+            self.units = units
+            self.rates.clear()
+            self.condition = None
+        condition = None
+        if system_status in PELLET_BURN_MODES:
+            bucket = 0 if system_status == GRILL_MODE_COOL_DOWN else round(set_temp / PELLET_BUCKET[units])
+            condition = (system_status, bucket)
+        if condition != self.condition or (self.level is not None and level - self.level >= PELLET_REFILL):
+            self.trend.reset()
+            self.condition = condition
+            self.prior = self.rates.get(condition)
+        self.level = level
+        if condition is None:
+            self.rate = None
+            self.empty_in = None
+            return None
+        self.trend.add(now, level)
+        span = self.trend.span()
+        slope = self.trend.slope() if span >= PELLET_MIN_SPAN else None
+        if slope is not None and slope <= 0:
+            burn = -slope * 3600
+            if self.prior is not None:
+                weight = math.exp(-(span - PELLET_MIN_SPAN) / PELLET_TAU)
+                burn = weight * self.prior + (1 - weight) * burn
+            self.rates[condition] = burn
+        self.rate = self._rate(condition)
+        self.empty_in = level / self.rate * 3600 if self.rate else None
+        return self.empty_in
+
+    def _rate(self, condition):
+        rate = self.rates.get(condition)
+        if rate is not None:
+            return rate
+        mode, bucket = condition
+        nearest = min((key for key in self.rates if key[0] == mode), key=lambda key: abs(key[1] - bucket),
+                      default=None)
+        return None if nearest is None else self.rates[nearest]
@@ -0,0 +1,130 @@
+"""
+In-memory temperature history per grill.
+
+Samples live in preallocated typed arrays used as ring buffers, one array
+per field, so recording a status is a handful of indexed stores: no list
+growth and no per-sample objects. Readers get memoryview slices of those
+arrays instead of copies.
+"""
+from array import array
+import math
+import time
+
+HISTORY_SIZE = 2048         # Samples kept per grill, about 3 hours at one status every 5 seconds
+
+# Status fields recorded for every grill, in addition to each probe's get_temp.
+HISTORY_FIELDS = ("grill", "set", "ambient", "pellet_level")
+
+NAN = float("nan")
+
+
+class GrillHistory:
+    """Fixed-size ring of timestamped samples for one grill.
+
+    times holds epoch seconds as doubles (floats would round them to about
+    two minutes); the fields in HISTORY_FIELDS and the probe temperatures,
+    keyed by accessory uuid, are float arrays. A value that is missing, or a
+    probe that is not connected, is stored as NaN. A probe seen for the first
+    time gets a column that is NaN for the samples before it.
+    """
+
+    def __init__(self, size=HISTORY_SIZE):
+        self.size = size
+        self.times = array("d", bytes(8 * size))
+        self.fields = {field: array("f", bytes(4 * size)) for field in HISTORY_FIELDS}
+        self.probes = {}
+        self.head = 0                                       #Slot the next sample goes in
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, status, now=None):
+        """Record the values of one status message."""
+        index = self.head
+        self.times[index] = time.time() if now is None else now
+        for field, column in self.fields.items():
+            value = status.get(field)
+            column[index] = NAN if value is None else value
+        seen = 0
+        for accessory in status.get("acc", ()):
+            if accessory["type"] != "probe":
+                continue
+            column = self.probes.get(accessory["uuid"])
+            if column is None:
+                column = self.probes[accessory["uuid"]] = array("f", [NAN]) * self.size
+            column[index] = accessory["probe"]["get_temp"] if accessory["con"] else NAN
+            seen += 1
+        if seen != len(self.probes):                        #A probe dropped out of the message
+            reported = {accessory["uuid"] for accessory in status.get("acc", ())}
+            for uuid, column in self.probes.items():
+                if uuid not in reported:
+                    column[index] = NAN
+        self.head = (index + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+
+    def column(self, name):
+        """The array of a field or probe uuid."""
+        if name == "time":
+            return self.times
+        column = self.fields.get(name)
+        return column if column is not None else self.probes[name]
+
+    def latest(self, name):
+        """The most recent value of a field or probe, None without samples."""
+        if not self.count:
+            return None
+        value = self.column(name)[self.head - 1]
+        return None if math.isnan(value) else value
+
+    def _time_at(self, position):
+        """Time of the sample at position, counted from the oldest."""
+        return self.times[(self.head - self.count + position) % self.size]
+
+    def count_since(self, since):
+        """How many of the newest samples are at or after since (epoch seconds)."""
+        low, high = 0, self.count                           #Binary search, times only grow
+        while low < high:
+            middle = (low + high) // 2
+            if self._time_at(middle) < since:
+                low = middle + 1
+            else:
+                high = middle
+        return self.count - low
+
+    def window(self, name, count=None, since=None):
+        """Zero-copy view of the newest samples of a field, probe uuid or "time".
+
+        Returns one memoryview, or two when the window wraps around the end of
+        the ring; read them in order, oldest first. count and since limit the
+        window to that many samples, or to samples at or after since. The views
+        are live, read them before the next append reuses the slots.
+        """
+        available = self.count if count is None else min(count, self.count)
+        if since is not None:
+            available = min(available, self.count_since(since))
+        view = memoryview(self.column(name))
+        start = self.head - available
+        if start >= 0:
+            return (view[start:self.head],)
+        return (view[start % self.size:self.size], view[:self.head])
+
+    def values(self, name, count=None, since=None):
+        """Iterate the window of a field oldest first, skipping NaN."""
+        for segment in self.window(name, count, since):
+            for value in segment:
+                if not math.isnan(value):
+                    yield value
+
+    def summary(self):
+        """Sample count, time span and latest values, for diagnostics."""
+        if not self.count:
+            return {"samples": 0}
+        return {
+            "samples": self.count,
+            "size": self.size,
+            "oldest": self._time_at(0),
+            "newest": self._time_at(self.count - 1),
+            "latest": {name: self.latest(name) for name in (*self.fields, *self.probes)},
+        }
@@ -0,0 +1,85 @@
+"""
+Hands MQTT payloads from the transport to the event loop.
+
+Transports may deliver messages from a thread other than the event loop.
+Instead of decoding and dispatching in the transport callback, payloads
+are parked here and drained on the event loop in one batch. While the loop is behind, routine updates are
+coalesced so only the latest payload per grill is kept, and urgent payloads
+(probe alarms and command acknowledgements) are drained first and never
+coalesced away.
+"""
+from collections import deque
+import logging
+import re
+import threading
+
+_LOGGER: logging.Logger = logging.getLogger(__package__)
+
+ALARM_PATTERN = re.compile(rb'alarm_fired"\s*:\s*(?:[1-9]|true)')
+
+URGENT_QUEUE_SIZE = 256
+
+
+def payload_has_alarm(payload):
+    """Cheap check for a fired probe alarm without decoding the payload."""
+    return ALARM_PATTERN.search(payload) is not None
+
+
+class MessageIngest:
+    """Bounded, coalescing handoff from any thread to the event loop.
+
+    The routine lane holds at most one payload per grill. The urgent lane
+    is a FIFO bounded at URGENT_QUEUE_SIZE; once it is full, acknowledgements
+    are demoted to the routine lane, while alarms are always queued.
+    """
+
+    def __init__(self, loop, handler, urgent_size=URGENT_QUEUE_SIZE):
+        self.loop = loop
+        self.handler = handler
+        self.urgent_size = urgent_size
+        self.lock = threading.Lock()
+        self.urgent = deque()
+        self.latest = {}
+        self.scheduled = False
+        self.received = 0
+        self.coalesced = 0
+
+    def push(self, grill_id, payload, ack=False):
+        """Queue a raw payload. Safe to call from any thread."""
+        alarm = payload_has_alarm(payload)
+        with self.lock:
+            self.received += 1
+            if alarm or (ack and len(self.urgent) < self.urgent_size):
+                # Anything routine still pending for this grill is older.
+                if self.latest.pop(grill_id, None) is not None:
+                    self.coalesced += 1
+                self.urgent.append((grill_id, payload))
+            else:
+                if grill_id in self.latest:
+                    self.coalesced += 1
+                self.latest[grill_id] = payload
+            if self.scheduled:
+                return
+            self.scheduled = True
+        self.loop.call_soon_threadsafe(self.drain)
+
+    def drain(self):
+        """Run the handler for everything queued. Runs on the event loop."""
+        with self.lock:
+            urgent, self.urgent = self.urgent, deque()
+            latest, self.latest = self.latest, {}
+            self.scheduled = False
+        for grill_id, payload in urgent:
+            self._handle(grill_id, payload)
+        for grill_id, payload in latest.items():
+            self._handle(grill_id, payload)
+
+    def pending(self):
+        with self.lock:
+            return len(self.urgent) + len(self.latest)
+
+    def _handle(self, grill_id, payload):
+        try:
+            self.handler(grill_id, payload)
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("Error handling update for %s", grill_id)
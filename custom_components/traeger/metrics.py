@@ -0,0 +1,212 @@
+"""
+Operational metrics of the traeger client.
+
+Plain counters and fixed-bucket histograms, cheap enough for the message
+path: an update is an integer add, an observation a bisect and two adds.
+They are read by the diagnostic sensors and rendered in the Prometheus text
+format by the metrics view.
+"""
+from bisect import bisect_left
+import time
+
+# Upper bounds in seconds, from sub-millisecond decodes to slow cloud calls.
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Counter:
+    """Monotonic count, optionally split by the value of one label."""
+
+    kind = "counter"
+
+    def __init__(self, name, description, label=None):
+        self.name = name
+        self.description = description
+        self.label = label
+        self.values = {} if label else {None: 0}
+
+    def inc(self, label_value=None, amount=1):
+        self.values[label_value] = self.values.get(label_value, 0) + amount
+
+    @property
+    def value(self):
+        return sum(self.values.values())
+
+    def samples(self):
+        for label_value, value in self.values.items():
+            labels = {} if label_value is None else {self.label: label_value}
+            yield f"{self.name}_total", labels, value
+
+    def as_dict(self):
+        if self.label is None:
+            return self.value
+        return dict(self.values)
+
+
+class Histogram:
+    """Distribution of durations in seconds over fixed buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name, description, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)        #Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.last = None
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.last = value
+
+    def time(self, started):
+        """Observe the time since a time.perf_counter() reading."""
+        self.observe(time.perf_counter() - started)
+
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q quantile, None if empty or past the last bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def samples(self):
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            yield f"{self.name}_bucket", {"le": repr(float(bound))}, seen
+        yield f"{self.name}_bucket", {"le": "+Inf"}, self.count
+        yield f"{self.name}_sum", {}, self.sum
+        yield f"{self.name}_count", {}, self.count
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "last": self.last,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+        }
+
+
+class HistogramFamily:
+    """Histograms split by the value of one label, created on first use."""
+
+    kind = "histogram"
+
+    def __init__(self, name, description, label, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label = label
+        self.buckets = buckets
+        self.children = {}
+
+    def child(self, label_value):
+        histogram = self.children.get(label_value)
+        if histogram is None:
+            histogram = self.children[label_value] = Histogram(self.name, self.description, self.buckets)
+        return histogram
+
+    def observe(self, label_value, value):
+        self.child(label_value).observe(value)
+
+    def samples(self):
+        for label_value, histogram in self.children.items():
+            for sample, labels, value in histogram.samples():
+                yield sample, {self.label: label_value, **labels}, value
+
+    def as_dict(self):
+        return {label_value: histogram.as_dict() for label_value, histogram in self.children.items()}
+
+
+class Gauge:
+    """Value read from a function when the metrics are collected."""
+
+    def __init__(self, name, description, func, kind="gauge"):
+        self.name = name
+        self.description = description
+        self.func = func
+        self.kind = kind
+
+    @property
+    def value(self):
+        return self.func()
+
+    def samples(self):
+        yield f"{self.name}_total" if self.kind == "counter" else self.name, {}, self.value
+
+    def as_dict(self):
+        return self.value
+
+
+class MetricsRegistry:
+    """Named metrics of one client."""
+
+    def __init__(self, prefix="traeger"):
+        self.prefix = prefix
+        self.metrics = {}
+
+    def _add(self, metric):
+        self.metrics[metric.name[len(self.prefix) + 1:]] = metric
+        return metric
+
+    def counter(self, name, description, label=None):
+        return self._add(Counter(f"{self.prefix}_{name}", description, label))
+
+    def histogram(self, name, description, buckets=DEFAULT_BUCKETS, label=None):
+        if label is not None:
+            return self._add(HistogramFamily(f"{self.prefix}_{name}", description, label, buckets))
+        return self._add(Histogram(f"{self.prefix}_{name}", description, buckets))
+
+    def gauge(self, name, description, func, kind="gauge"):
+        """A value owned elsewhere, read on collection. kind="counter" for running totals."""
+        return self._add(Gauge(f"{self.prefix}_{name}", description, func, kind))
+
+    def get(self, name):
+        return self.metrics[name]
+
+    def as_dict(self):
+        return {name: metric.as_dict() for name, metric in self.metrics.items()}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def render_prometheus(registries):
+    """Prometheus text exposition of (labels, registry) pairs, the labels telling the registries apart."""
+    families = {}
+    for labels, registry in registries:
+        for metric in registry.metrics.values():
+            families.setdefault(metric.name, []).append((labels, metric))
+    lines = []
+    for name, members in families.items():
+        first = members[0][1]
+        if first.kind == "counter":                         #In text format 0.0.4 the family is named like its samples
+            name = f"{name}_total"
+        lines.append(f"# HELP {name} {first.description}")
+        lines.append(f"# TYPE {name} {first.kind}")
+        for labels, metric in members:
+            for sample, sample_labels, value in metric.samples():
+                if value is None:
+                    continue
+                lines.append(f"{sample}{_format_labels({**labels, **sample_labels})} {value}")
+    lines.append("")
+    return "\n".join(lines)
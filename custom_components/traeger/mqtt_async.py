@@ -0,0 +1,308 @@
+"""
+Asyncio MQTT-over-websocket transport for the traeger client.
+
+Runs the MQTT session directly on the Home Assistant event loop using the
+shared aiohttp session, so there is no extra thread per config entry and
+nothing blocks the loop while connecting. Only the part of MQTT 3.1.1 the
+Traeger cloud uses is implemented: CONNECT, SUBSCRIBE, inbound PUBLISH
+(QoS 0/1), PINGREQ and DISCONNECT. Callbacks use the same signatures as
+paho so the traeger client can hand either transport the same handlers.
+"""
+import asyncio
+import logging
+import struct
+
+import aiohttp
+from yarl import URL
+
+_LOGGER: logging.Logger = logging.getLogger(__package__)
+
+CONNECT = 0x10
+CONNACK = 0x20
+PUBLISH = 0x30
+PUBACK = 0x40
+SUBSCRIBE = 0x80
+SUBACK = 0x90
+PINGREQ = 0xC0
+PINGRESP = 0xD0
+DISCONNECT = 0xE0
+
+MQTT_ERR_SUCCESS = 0
+MQTT_ERR_NO_CONN = 4
+
+
+def build_packet(header, body=b""):
+    """Frame an MQTT control packet: fixed header, remaining length, body."""
+    length = len(body)
+    encoded = bytearray([header])
+    while True:
+        digit = length & 0x7F
+        length >>= 7
+        if length:
+            encoded.append(digit | 0x80)
+        else:
+            encoded.append(digit)
+            break
+    return bytes(encoded) + body
+
+
+def build_string(value):
+    """Encode a length prefixed UTF-8 string."""
+    data = value.encode("utf-8")
+    return struct.pack("!H", len(data)) + data
+
+
+class PacketReader:
+    """Reassembles MQTT packets from websocket frames.
+
+    A frame may carry several packets or only part of one, so incomplete
+    data is kept until the rest arrives.
+    """
+
+    def __init__(self):
+        self.buffer = b""
+
+    def feed(self, data):
+        """Return a list of (header, body) for every complete packet."""
+        buffer = self.buffer + data if self.buffer else data
+        packets = []
+        offset = 0
+        end = len(buffer)
+        while offset + 2 <= end:
+            length = 0
+            shift = 0
+            pos = offset + 1
+            while True:
+                if pos >= end:
+                    self.buffer = buffer[offset:]
+                    return packets
+                digit = buffer[pos]
+                pos += 1
+                length |= (digit & 0x7F) << shift
+                shift += 7
+                if not digit & 0x80:
+                    break
+                if shift > 21:
+                    raise ValueError("Malformed MQTT remaining length")
+            if pos + length > end:
+                break
+            packets.append((buffer[offset], buffer[pos:pos + length]))
+            offset = pos + length
+        self.buffer = buffer[offset:]
+        return packets
+
+
+class MqttMessage:
+    """Inbound PUBLISH, shaped like paho's MQTTMessage."""
+
+    __slots__ = ("topic", "payload", "qos", "retain", "mid")
+
+    def __init__(self, topic, payload, qos=0, retain=False, mid=0):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+        self.mid = mid
+
+
+class AsyncMqttClient:
+    """Minimal MQTT client that lives on the event loop.
+
+    Mirrors the parts of paho.mqtt.client.Client the traeger client uses:
+    the on_* callbacks, subscribe(), disconnect() and reconnect_delay_set().
+    connect_async() starts a background task that connects, reads and
+    reconnects with backoff until disconnect() is called.
+    """
+
+    def __init__(self, session, client_id, keepalive=300):
+        self.session = session
+        self.client_id = client_id
+        self.keepalive = keepalive
+        self.userdata = None
+        self.url = None
+        self.ssl_context = None
+        self.on_connect = None
+        self.on_connect_fail = None
+        self.on_subscribe = None
+        self.on_message = None
+        self.on_disconnect = None
+        self.min_delay = 1
+        self.max_delay = 120
+        self.connected = False
+        self._ws = None
+        self._task = None
+        self._running = False
+        self._ping_outstanding = False
+        self._send_lock = asyncio.Lock()
+        self._mid = 0
+
+    def reconnect_delay_set(self, min_delay=1, max_delay=120):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+
+    def connect_async(self, url, ssl_context=None):
+        """Start (or retarget) the connection task. Returns immediately."""
+        self.url = url
+        self.ssl_context = ssl_context
+        self._running = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        elif self._ws is not None:
+            # Already connected, drop the socket so the task reconnects on the new URL.
+            asyncio.get_running_loop().create_task(self._ws.close())
+
+    def subscribe(self, topic, qos=0):
+        """Subscribe to a topic, a (topic, qos) tuple or a list of tuples."""
+        if not self.connected:
+            return (MQTT_ERR_NO_CONN, None)
+        if isinstance(topic, tuple):
+            topics = [topic]
+        elif isinstance(topic, list):
+            topics = topic
+        else:
+            topics = [(topic, qos)]
+        mid = self._next_mid()
+        body = struct.pack("!H", mid)
+        for name, topic_qos in topics:
+            body += build_string(name) + bytes([topic_qos])
+        self._send_soon(build_packet(SUBSCRIBE | 0x02, body))
+        return (MQTT_ERR_SUCCESS, mid)
+
+    def disconnect(self):
+        """Stop the connection task, sending DISCONNECT if connected."""
+        self._running = False
+        if self._ws is not None:
+            self._send_soon(build_packet(DISCONNECT), close=True)
+        elif self._task is not None:
+            self._task.cancel()
+        return MQTT_ERR_SUCCESS
+
+    async def async_disconnect(self):
+        """Disconnect and wait for the connection task to finish."""
+        self.disconnect()
+        if self._task is not None:
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def is_connected(self):
+        return self.connected
+
+    def _next_mid(self):
+        self._mid = self._mid % 0xFFFF + 1
+        return self._mid
+
+    def _send_soon(self, packet, close=False):
+        asyncio.get_running_loop().create_task(self._send(packet, close))
+
+    async def _send(self, packet, close=False):
+        ws = self._ws
+        if ws is None or ws.closed:
+            return
+        try:
+            async with self._send_lock:
+                await ws.send_bytes(packet)
+            if close:
+                await ws.close()
+        except (aiohttp.ClientError, ConnectionError, RuntimeError) as exception:
+            _LOGGER.debug(f"MQTT send failed: {exception}")
+
+    async def _run(self):
+        delay = self.min_delay
+        while self._running:
+            try:
+                await self._session()
+                delay = self.min_delay
+            except asyncio.CancelledError:
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError, ValueError) as exception:
+                _LOGGER.warning(f"MQTT connection failed: {exception}")
+                self._callback(self.on_connect_fail, self, self.userdata)
+            if not self._running:
+                break
+            _LOGGER.debug(f"MQTT reconnect in {delay} seconds")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_delay)
+        _LOGGER.debug(f"Async MQTT task finished.")
+
+    async def _session(self):
+        reader = PacketReader()
+        async with self.session.ws_connect(
+            URL(self.url, encoded=True),
+            protocols=("mqtt",),
+            ssl=self.ssl_context,
+            max_msg_size=0,
+        ) as ws:
+            self._ws = ws
+            self._ping_outstanding = False
+            pinger = asyncio.get_running_loop().create_task(self._keepalive())
+            try:
+                await self._send(self._connect_packet())
+                async for msg in ws:
+                    if msg.type == aiohttp.WSMsgType.BINARY:
+                        for header, body in reader.feed(msg.data):
+                            self._handle(header, body)
+                    elif msg.type == aiohttp.WSMsgType.ERROR:
+                        break
+            finally:
+                pinger.cancel()
+                self._ws = None
+                was_connected = self.connected
+                self.connected = False
+                if was_connected:
+                    self._callback(self.on_disconnect, self, self.userdata, 0 if not self._running else 1)
+
+    def _connect_packet(self):
+        body = build_string("MQTT") + bytes([4, 0x02]) + struct.pack("!H", self.keepalive)
+        body += build_string(self.client_id)
+        return build_packet(CONNECT, body)
+
+    async def _keepalive(self):
+        while True:
+            await asyncio.sleep(self.keepalive)
+            if self._ping_outstanding:
+                _LOGGER.warning(f"MQTT keepalive timed out, reconnecting")
+                await self._ws.close()
+                return
+            self._ping_outstanding = True
+            await self._send(build_packet(PINGREQ))
+
+    def _handle(self, header, body):
+        packet_type = header & 0xF0
+        if packet_type == PUBLISH:
+            qos = (header >> 1) & 0x03
+            topic_length = struct.unpack_from("!H", body)[0]
+            pos = 2 + topic_length
+            topic = body[2:pos].decode("utf-8")
+            mid = 0
+            if qos:
+                mid = struct.unpack_from("!H", body, pos)[0]
+                pos += 2
+                if qos == 1:
+                    self._send_soon(build_packet(PUBACK, struct.pack("!H", mid)))
+            message = MqttMessage(topic, memoryview(body)[pos:], qos, bool(header & 0x01), mid)
+            self._callback(self.on_message, self, self.userdata, message)
+        elif packet_type == CONNACK:
+            rc = body[1]
+            self.connected = rc == 0
+            self._callback(self.on_connect, self, self.userdata, {"session present": body[0] & 0x01}, rc)
+            if rc != 0:
+                _LOGGER.warning(f"MQTT connection refused rc:{rc}")
+                self._running = False
+                self._send_soon(build_packet(DISCONNECT), close=True)
+        elif packet_type == SUBACK:
+            mid = struct.unpack_from("!H", body)[0]
+            self._callback(self.on_subscribe, self, self.userdata, mid, tuple(body[2:]))
+        elif packet_type == PINGRESP:
+            self._ping_outstanding = False
+
+    @staticmethod
+    def _callback(callback, *args):
+        if callback is None:
+            return
+        try:
+            callback(*args)
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("Error in MQTT callback %s", callback)
@@ -18,19 +18,23 @@ async def async_setup_entry(hass, entry, async_add_devices):
 class TraegerNumberEntity(NumberEntity, TraegerBaseEntity):
     """Traeger Number/Timer Value class."""
 
+    grill_fields = ()
+
     def __init__(self, client, grill_id, devname):
         super().__init__(client, grill_id)
         self.devname = devname
         self.grill_register_callback()
 
+    def grill_watched_fields(self):
+        return super().grill_watched_fields() + (f"{self.devname}_start", f"{self.devname}_end")
+
     # Generic Properties
     @property
     def name(self):
         """Return the name of the grill"""
         if self.grill_details is None:
             return f"{self.grill_id}_{self.devname}"
-        name = self.grill_details["friendlyName"]
-        return f"{name} {self.devname.capitalize()}"
+        return self.grill_entity_name(self.devname.capitalize())
 
     @property
     def unique_id(self):
@@ -0,0 +1,88 @@
+"""
+Optimistic status overlay for commands that have not been echoed yet.
+
+A status path is a tuple of keys into the status dict, either a top level
+field such as ("set",) or a probe field such as
+("acc", <uuid>, "probe", "set_temp").
+"""
+import time
+
+# Switch commands and the status field value they lead to.
+SWITCH_COMMANDS = {
+    "18": ("keepwarm", 1),
+    "19": ("keepwarm", 0),
+    "20": ("smoke", 1),
+    "21": ("smoke", 0),
+}
+
+
+class OptimisticValue:
+    """Expected value of one status path after a command."""
+
+    __slots__ = ("expected", "baseline", "deadline")
+
+    def __init__(self, expected, baseline, deadline):
+        self.expected = expected
+        self.baseline = baseline
+        self.deadline = deadline
+
+
+def get_path(snapshot, path):
+    """Value of a status path in a GrillSnapshot, probes found through its accessory index."""
+    if path[0] == "acc":
+        accessory = snapshot.accessories.get(path[1])
+        return None if accessory is None else accessory[path[2]][path[3]]
+    return snapshot.status.get(path[0])
+
+
+def command_expectations(command, status):
+    """Return {path: value} the grill should report once command is applied."""
+    code, _, value = command.partition(",")
+    if code == "11":
+        return {("set",): int(value)}
+    if code == "12":
+        start = int(time.time())
+        return {("cook_timer_start",): start, ("cook_timer_end",): start + int(value)}
+    if code == "14":
+        # The probe command carries no probe id, it targets the connected probe(s).
+        return {
+            ("acc", accessory["uuid"], "probe", "set_temp"): int(value)
+            for accessory in status.get("acc", ())
+            if accessory["type"] == "probe" and accessory["con"]
+        }
+    if code in SWITCH_COMMANDS:
+        field, expected = SWITCH_COMMANDS[code]
+        return {(field,): expected}
+    return {}
+
+
+def apply_overlay(status, overlay):
+    """Return a copy of status with the overlay values applied."""
+    status = dict(status)
+    probes = {}
+    for path, value in overlay.items():
+        if path[0] == "acc":
+            probes.setdefault(path[1], {})[path[3]] = value.expected
+        else:
+            status[path[0]] = value.expected
+    if probes:
+        status["acc"] = [
+            {**accessory, "probe": {**accessory["probe"], **probes[accessory["uuid"]]}}
+            if accessory["uuid"] in probes else accessory
+            for accessory in status.get("acc", ())
+        ]
+    return status
+
+
+def reconcile(overlay, snapshot, now):
+    """Drop overlay values the authoritative snapshot settled.
+
+    A value is settled once the grill reports it, or reports anything other
+    than what it did when the command was sent (the grill acted, so trust
+    it), or once its deadline passes, which rolls it back.
+    """
+    for path in list(overlay):
+        value = overlay[path]
+        actual = get_path(snapshot, path)
+        if actual == value.expected or actual != value.baseline or now >= value.deadline:
+            del overlay[path]
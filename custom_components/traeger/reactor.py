@@ -0,0 +1,290 @@
+"""
+I/O reactor shared by every Traeger config entry.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import heapq
+import logging
+import ssl
+import threading
+
+_LOGGER: logging.Logger = logging.getLogger(__package__)
+
+TICK_INTERVAL = 1           # Seconds between paho housekeeping (keepalive) passes
+RECONNECT_MIN_DELAY = 10
+RECONNECT_MAX_DELAY = 160
+DISCONNECT_TIMEOUT = 5
+
+
+class ReactorTimer:
+    """Handle returned by TraegerReactor.call_later, used like asyncio.TimerHandle."""
+
+    __slots__ = ("when", "callback", "args", "_cancelled")
+
+    def __init__(self, when, callback, args):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def cancelled(self):
+        return self._cancelled
+
+    def __lt__(self, other):
+        return self.when < other.when
+
+
+class ReactorClient:
+    """Reactor bookkeeping for one paho client."""
+
+    __slots__ = ("fd", "connecting", "retired", "delay", "reconnect", "closed", "watchdog")
+
+    def __init__(self, watchdog=None):
+        self.fd = None
+        self.connecting = False
+        self.retired = False
+        self.delay = RECONNECT_MIN_DELAY
+        self.reconnect = None
+        self.closed = None
+        self.watchdog = watchdog                            #Times the socket reads and writes, if set
+
+
+class TraegerReactor:
+    """Runs the MQTT sessions and timers of every account on the event loop.
+
+    Paho clients are driven through paho's external loop API: their sockets
+    are watched with add_reader/add_writer and one periodic tick runs the
+    keepalive for all of them, so no account has a network thread of its
+    own. Connects (DNS, TLS and websocket handshakes) block, so they run on
+    one shared connect thread. Token and URL timers of all accounts sit in
+    one heap served by a single loop timer. The SSL context is built once.
+    The asyncio transport already runs on the loop and only shares the SSL
+    context and the timers.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.clients = {}
+        self.timers = []
+        self._timer_handle = None
+        self._tick = None
+        self._ssl_context = None
+        self._executor = None
+        self._loop_thread = threading.get_ident()
+
+    def shutdown(self):
+        """Stop the timers and the connect thread, once no entry uses the reactor."""
+        if self._timer_handle is not None:
+            self._timer_handle.cancel()
+            self._timer_handle = None
+        if self._tick is not None:
+            self._tick.cancel()
+            self._tick = None
+        self.timers.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def ssl_context(self):
+        if self._ssl_context is None:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+            self._ssl_context = context
+        return self._ssl_context
+
+#===========================Timers=====================================================================
+    def call_later(self, delay, callback, *args):
+        """Like loop.call_later, but every timer shares one loop handle."""
+        timer = ReactorTimer(self.loop.time() + max(delay, 0), callback, args)
+        heapq.heappush(self.timers, timer)
+        if self.timers[0] is timer:
+            self._schedule_timers()
+        return timer
+
+    def _schedule_timers(self):
+        if self._timer_handle is not None:
+            self._timer_handle.cancel()
+            self._timer_handle = None
+        while self.timers and self.timers[0].cancelled():
+            heapq.heappop(self.timers)
+        if self.timers:
+            self._timer_handle = self.loop.call_at(self.timers[0].when, self._run_timers)
+
+    def _run_timers(self):
+        self._timer_handle = None
+        now = self.loop.time()
+        while self.timers and self.timers[0].when <= now:
+            timer = heapq.heappop(self.timers)
+            if timer.cancelled():
+                continue
+            try:
+                timer.callback(*timer.args)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception(f"Error in reactor timer {timer.callback}")
+        self._schedule_timers()
+
+#===========================Paho Clients===============================================================
+    def connect(self, client, host, port, keepalive, watchdog=None):
+        """Start connecting a paho client and drive it from now on."""
+        state = self.clients.setdefault(client, ReactorClient(watchdog))
+        client.on_socket_open = self._socket_open
+        client.on_socket_close = self._socket_close
+        client.on_socket_register_write = self._register_write
+        client.on_socket_unregister_write = self._unregister_write
+        self._start_tick()
+        self._run_connect(client, state, lambda: client.connect(host, port, keepalive=keepalive))
+
+    def disconnect(self, client):
+        """Disconnect a paho client for good. Returns a future done once its socket is closed."""
+        state = self.clients.get(client)
+        if state is None:
+            future = self.loop.create_future()
+            future.set_result(None)
+            return future
+        state.retired = True
+        if state.reconnect is not None:
+            state.reconnect.cancel()
+            state.reconnect = None
+        if state.closed is None:
+            state.closed = self.loop.create_future()
+        if not state.connecting:                            #Else finished in _connect_done
+            self._close(client, state)
+        return state.closed
+
+    def _close(self, client, state):
+        if state.fd is None:                                #Not connected, nothing to flush
+            self._drop(client)
+        else:
+            client.disconnect()                             #Socket closes once DISCONNECT is written
+
+    async def async_disconnect(self, client):
+        try:
+            await asyncio.wait_for(asyncio.shield(self.disconnect(client)), DISCONNECT_TIMEOUT)
+        except asyncio.TimeoutError:
+            _LOGGER.warning(f"MQTT client {client} did not close in time")
+            self._drop(client)
+
+    def _drop(self, client):
+        state = self.clients.pop(client, None)
+        if state is None:
+            return
+        if state.fd is not None:
+            self.loop.remove_reader(state.fd)
+            self.loop.remove_writer(state.fd)
+            state.fd = None
+        if state.closed is not None and not state.closed.done():
+            state.closed.set_result(None)
+        if not self.clients and self._tick is not None:
+            self._tick.cancel()
+            self._tick = None
+
+    def _run_connect(self, client, state, connect):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="traeger_connect")
+        state.connecting = True
+        future = self.loop.run_in_executor(self._executor, connect)
+        future.add_done_callback(lambda future: self._connect_done(client, state, future))
+
+    def _connect_done(self, client, state, future):
+        state.connecting = False
+        if state.retired:                                   #Disconnected while connecting
+            self._close(client, state)
+            return
+        exception = None if future.cancelled() else future.exception()
+        if exception is None:
+            return
+        _LOGGER.warning(f"MQTT connect failed: {exception!r}")
+        if client.on_connect_fail is not None:
+            client.on_connect_fail(client, None)
+        if not state.retired:
+            self._schedule_reconnect(client, state)
+
+    def _schedule_reconnect(self, client, state):
+        _LOGGER.debug(f"MQTT reconnect in {state.delay} seconds")
+        state.reconnect = self.call_later(state.delay, self._reconnect, client, state)
+        state.delay = min(state.delay * 2, RECONNECT_MAX_DELAY)
+
+    def _reconnect(self, client, state):
+        state.reconnect = None
+        if not state.retired:
+            self._run_connect(client, state, client.reconnect)
+
+    def _start_tick(self):
+        if self._tick is None:
+            self._tick = self.call_later(TICK_INTERVAL, self._housekeeping)
+
+    def _housekeeping(self):
+        self._tick = None
+        for client, state in list(self.clients.items()):
+            if state.fd is not None:
+                client.loop_misc()
+                if client.is_connected():
+                    state.delay = RECONNECT_MIN_DELAY
+        if self.clients:
+            self._start_tick()
+
+    def _read(self, client):
+        client.loop_read()
+        sock = client.socket()
+        while sock is not None and sock.pending():         #TLS may hold data the selector can't see
+            client.loop_read()
+            sock = client.socket()
+
+    def _in_loop(self, callback, *args):
+        """Paho calls the socket callbacks on the connect thread too."""
+        if threading.get_ident() == self._loop_thread:
+            callback(*args)
+        else:
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    def _socket_open(self, client, userdata, sock):
+        self._in_loop(self._watch, client, sock.fileno())
+
+    def _watch(self, client, fd):
+        state = self.clients.get(client)
+        if state is None:
+            return
+        state.fd = fd
+        if state.watchdog is None:
+            self.loop.add_reader(fd, self._read, client)
+        else:
+            self.loop.add_reader(fd, state.watchdog.wrap(self._read), client)
+
+    def _socket_close(self, client, userdata, sock):
+        self._in_loop(self._unwatch, client)
+
+    def _unwatch(self, client):
+        state = self.clients.get(client)
+        if state is None:
+            return
+        if state.fd is not None:
+            self.loop.remove_reader(state.fd)
+            self.loop.remove_writer(state.fd)
+            state.fd = None
+        if state.retired:
+            self._drop(client)
+        elif state.reconnect is None:
+            self._schedule_reconnect(client, state)
+
+    def _register_write(self, client, userdata, sock):
+        self._in_loop(self._watch_write, client)
+
+    def _watch_write(self, client):
+        state = self.clients.get(client)
+        if state is not None and state.fd is not None:
+            if state.watchdog is None:
+                self.loop.add_writer(state.fd, client.loop_write)
+            else:
+                self.loop.add_writer(state.fd, state.watchdog.wrap(client.loop_write))
+
+    def _unregister_write(self, client, userdata, sock):
+        self._in_loop(self._unwatch_write, client)
+
+    def _unwatch_write(self, client):
+        state = self.clients.get(client)
+        if state is not None and state.fd is not None:
+            self.loop.remove_writer(state.fd)
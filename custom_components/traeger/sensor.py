@@ -1,25 +1,34 @@
 """Sensor platform for Traeger."""
-from homeassistant.helpers.entity import Entity
-from homeassistant.const import ATTR_TEMPERATURE, TEMP_CELSIUS, TEMP_FAHRENHEIT
+from datetime import timedelta
+
+from homeassistant.helpers.device_registry import DeviceEntryType
+from homeassistant.helpers.entity import Entity, EntityCategory
+from homeassistant.const import ATTR_TEMPERATURE, TEMP_FAHRENHEIT
+from homeassistant.util import dt as dt_util
 
 from .const import (
     DEFAULT_NAME,
     DOMAIN,
-    GRILL_MODE_OFFLINE,
-    GRILL_MODE_COOL_DOWN,
-    GRILL_MODE_CUSTOM_COOK,
-    GRILL_MODE_MANUAL_COOK,
-    GRILL_MODE_PREHEATING,
-    GRILL_MODE_IGNITING,
-    GRILL_MODE_IDLE,
-    GRILL_MODE_SLEEPING,
-    GRILL_MODE_SHUTDOWN,
-    GRILL_MIN_TEMP_C,
-    GRILL_MIN_TEMP_F,
+    NAME,
 )
 
 from .entity import TraegerBaseEntity, TraegerGrillMonitor
 
+SCAN_INTERVAL = timedelta(seconds=30)       # Metric sensors poll, grill sensors are pushed
+
+# Client metrics shown as diagnostic sensors: (metric, name, unit, icon)
+METRIC_SENSORS = (
+    ("messages_received", "Messages Received", None, "mdi:message-arrow-left"),
+    ("message_decode_seconds", "Message Decode Time", "ms", "mdi:timer-sand"),
+    ("message_dispatch_seconds", "Message Dispatch Time", "ms", "mdi:timer-sand"),
+    ("mqtt_reconnects", "MQTT Reconnects", None, "mdi:connection"),
+    ("mqtt_url_refresh_seconds", "MQTT URL Refresh Time", "ms", "mdi:timer-sand"),
+    ("token_renew_seconds", "Token Renew Time", "ms", "mdi:timer-sand"),
+    ("api_errors", "API Errors", None, "mdi:alert-circle"),
+    ("token_remaining_seconds", "Token Time Remaining", "s", "mdi:key"),
+    ("mqtt_url_remaining_seconds", "MQTT URL Time Remaining", "s", "mdi:link"),
+)
+
 
 async def async_setup_entry(hass, entry, async_add_devices):
     """Setup sensor platform."""
@@ -28,38 +37,47 @@ async def async_setup_entry(hass, entry, async_add_devices):
     for grill in grills:
         grill_id = grill["thingName"]
         async_add_devices([PelletSensor(client, grill["thingName"], "Pellet Level", "pellet_level")])
+        async_add_devices([PelletTimeToEmpty(client, grill["thingName"], "Pellets Time To Empty", "pellet_empty")])
         async_add_devices([ValueTemperature(client, grill["thingName"], "Ambient Temperature", "ambient")])
         async_add_devices([GrillTimer(client, grill["thingName"], "Cook Timer Start", "cook_timer_start")])
         async_add_devices([GrillTimer(client, grill["thingName"], "Cook Timer End", "cook_timer_end")])
         async_add_devices([GrillState(client, grill["thingName"], "Grill State", "grill_state")])
         async_add_devices([HeatingState(client, grill["thingName"], "Heating State", "heating_state")])
-        TraegerGrillMonitor(client, grill_id, async_add_devices, ProbeState)
+        monitor = TraegerGrillMonitor(client, grill_id, async_add_devices, ProbeState)
+        entry.async_on_unload(monitor.unsubscribe)
+        monitor = TraegerGrillMonitor(client, grill_id, async_add_devices, ProbeTimeToTarget)
+        entry.async_on_unload(monitor.unsubscribe)
+    async_add_devices([
+        TraegerMetricSensor(client, entry.entry_id, metric, friendly_name, unit, icon)
+        for metric, friendly_name, unit, icon in METRIC_SENSORS
+    ])
 
 
 class TraegerBaseSensor(TraegerBaseEntity):
 
+    grill_fields = ()
+
     def __init__(self, client, grill_id, friendly_name, value):
         super().__init__(client, grill_id)
         self.value = value
         self.friendly_name = friendly_name
         self.grill_register_callback()
 
+    def grill_watched_fields(self):
+        return super().grill_watched_fields() + (self.value,)
+
     # Generic Properties
     @property
     def available(self):
         """Reports unavailable when the grill is powered off"""
-        if self.grill_state is None:
+        if self.grill_snapshot is None:
             return False
-        else:
-            return self.grill_state["connected"]
+        return self.grill_snapshot.connected
 
     @property
     def name(self):
         """Return the name of the grill"""
-        if self.grill_details is None:
-            return f"{self.grill_id} {self.friendly_name}"
-        name = self.grill_details["friendlyName"]
-        return f"{name} {self.friendly_name}"
+        return self.grill_entity_name(self.friendly_name)
 
     @property
     def unique_id(self):
@@ -88,6 +106,8 @@ class ValueTemperature(TraegerBaseSensor):
 class PelletSensor(TraegerBaseSensor):
     """Traeger Pellet Sensor class."""
 
+    grill_fields = ("features",)
+
     # Generic Properties
     @property
     def available(self):
@@ -107,6 +127,43 @@ class PelletSensor(TraegerBaseSensor):
         return "%"
 
 
+class PelletTimeToEmpty(PelletSensor):
+    """Predicted hours until the hopper runs out at the learned burn rate."""
+
+    grill_fields = ("features", "pellet_level", "set", "system_status")
+
+    def grill_refresh_state(self):
+        """Refresh the grill's pellet estimator along with the grill state"""
+        super().grill_refresh_state()
+        self.estimator = self.client.get_pellet_estimator(self.grill_id)
+
+    @property
+    def icon(self):
+        return "mdi:timer-sand"
+
+    # Sensor Properties
+    @property
+    def state(self):
+        if self.estimator is None or self.estimator.empty_in is None:
+            return None
+        return round(self.estimator.empty_in / 3600, 1)
+
+    @property
+    def unit_of_measurement(self):
+        return "h"
+
+    @property
+    def extra_state_attributes(self):
+        if self.estimator is None:
+            return None
+        rate = self.estimator.rate
+        empty_in = self.estimator.empty_in
+        return {
+            "burn_rate_per_hour": None if rate is None else round(rate, 2),
+            "empty_at": None if empty_in is None else (dt_util.utcnow() + timedelta(seconds=empty_in)).isoformat(),
+        }
+
+
 class GrillTimer(TraegerBaseSensor):
     """Traeger Timer class."""
 
@@ -126,6 +183,8 @@ class GrillState(TraegerBaseSensor):
     These states correlate with the Traeger application.
     """
 
+    grill_fields = ("system_status",)
+
     # Generic Properties
     @property
     def icon(self):
@@ -134,40 +193,22 @@ class GrillState(TraegerBaseSensor):
     # Sensor Properties
     @property
     def state(self):
-
-        state = self.grill_state["system_status"]
-
-        if state == GRILL_MODE_COOL_DOWN:
-            return "cool_down"
-        elif state == GRILL_MODE_CUSTOM_COOK:
-            return "cook_custom"
-        elif state == GRILL_MODE_MANUAL_COOK:
-            return "cook_manual"
-        elif state == GRILL_MODE_PREHEATING:
-            return "preheating"
-        elif state == GRILL_MODE_IGNITING:
-            return "igniting"
-        elif state == GRILL_MODE_IDLE:
-            return "idle"
-        elif state == GRILL_MODE_SLEEPING:
-            return "sleeping"
-        elif state == GRILL_MODE_OFFLINE:
-            return "offline"
-        elif state == GRILL_MODE_SHUTDOWN:
-            return "shutdown"
-        else:
-            return "unknown"    # Likely a new state we don't know about
+        if self.grill_snapshot is None:
+            return None
+        return self.grill_snapshot.grill_state
 
 
 class HeatingState(TraegerBaseSensor):
-    """Traeger Heating State class."""
+    """Traeger Heating State class.
+    The state machine runs once per grill message in the client, see states.py.
+    """
 
-    def __init__(self, client, grill_id, friendly_name, value):
-        super().__init__(client, grill_id, friendly_name, value)
-        self.previous_target_temp = None
-        self.previous_state = "idle"
-        self.preheat_modes = [GRILL_MODE_PREHEATING, GRILL_MODE_IGNITING]
-        self.cook_modes = [GRILL_MODE_CUSTOM_COOK, GRILL_MODE_MANUAL_COOK]
+    grill_fields = ("set", "system_status", "grill")
+
+    def grill_refresh_state(self):
+        """Refresh the grill's heating state along with the grill state"""
+        super().grill_refresh_state()
+        self.heating_state = self.client.get_heating_state(self.grill_id)
 
     # Generic Properties
     @property
@@ -180,118 +221,36 @@ class HeatingState(TraegerBaseSensor):
     # Sensor Properties
     @property
     def state(self):
-        if self.grill_state is None:
+        if self.grill_state is None or self.heating_state is None:
             return "idle"
-
-        target_temp = self.grill_state["set"]
-        grill_mode = self.grill_state["system_status"]
-        current_temp = self.grill_state["grill"]
-        target_changed = True if target_temp != self.previous_target_temp else False
-        min_cook_temp = (
-            GRILL_MIN_TEMP_C if self.grill_units == TEMP_CELSIUS else GRILL_MIN_TEMP_F
-        )
-        temp_swing = 11 if self.grill_units == TEMP_CELSIUS else 20
-        low_temp = target_temp - temp_swing
-        high_temp = target_temp + temp_swing
-
-        if grill_mode in self.preheat_modes:
-            if current_temp < min_cook_temp:
-                state = "preheating"
-            else:
-                state = "heating"
-        elif grill_mode in self.cook_modes:
-            if self.previous_state == "heating" or self.previous_state == "preheating":
-                if current_temp >= target_temp:
-                    state = "at_temp"
-                else:
-                    state = "heating"
-            elif self.previous_state == "cooling":
-                if current_temp <= target_temp:
-                    state = "at_temp"
-                else:
-                    state = "cooling"
-            elif self.previous_state == "at_temp":
-                if current_temp > high_temp:
-                    state = "over_temp"
-                elif current_temp < low_temp:
-                    state = "under_temp"
-                else:
-                    state = "at_temp"
-            elif self.previous_state == "under_temp":
-                if current_temp > low_temp:
-                    state = "at_temp"
-                else:
-                    state = "under_temp"
-            elif self.previous_state == "over_temp":
-                if current_temp < high_temp:
-                    state = "at_temp"
-                else:
-                    state = "over_temp"
-            # Catch all if coming from idle/unavailable
-            else:
-                target_changed = True
-
-            if target_changed:
-                if current_temp <= target_temp:
-                    state = "heating"
-                else:
-                    state = "cooling"
-        elif grill_mode == GRILL_MODE_COOL_DOWN:
-            state = "cool_down"
-        else:
-            state = "idle"
-
-        self.previous_target_temp = target_temp
-        self.previous_state = state
-
-        return state
+        return self.heating_state.state
 
 
 class ProbeState(TraegerBaseSensor):
 
+    grill_fields = ("acc", "system_status")
+
     def __init__(self, client, grill_id, sensor_id):
-        super().__init__(client, grill_id, f"Probe State {sensor_id}", f"probe_state_{sensor_id}")
         self.sensor_id = sensor_id
-        self.grill_accessory = self.client.get_details_for_accessory(
-            self.grill_id, self.sensor_id
-        )
-        self.previous_target_temp = None
-        self.probe_alarm = False
-        self.active_modes = [GRILL_MODE_PREHEATING, GRILL_MODE_IGNITING, GRILL_MODE_CUSTOM_COOK, GRILL_MODE_MANUAL_COOK]
-
-        # Tell the Traeger client to call grill_accessory_update() when it gets an update
-        self.client.set_callback_for_grill(self.grill_id, self.grill_accessory_update)
+        super().__init__(client, grill_id, f"Probe State {sensor_id}", f"probe_state_{sensor_id}")
 
-    def grill_accessory_update(self):
-        """This gets called when the grill has an update. Update state variable"""
-        self.grill_refresh_state()
+    def grill_refresh_state(self):
+        """Refresh the accessory and its probe state along with the grill state"""
+        super().grill_refresh_state()
         self.grill_accessory = self.client.get_details_for_accessory(
             self.grill_id, self.sensor_id
         )
-
-        if self.hass is None:
-            return
-
-        # Tell HA we have an update
-        self.schedule_update_ha_state()
+        self.probe_state = self.client.get_probe_state(self.grill_id, self.sensor_id)
 
     # Generic Properties
     @property
     def available(self):
         """Reports unavailable when the probe is not connected"""
-
         if (self.grill_state is None
                 or self.grill_state["connected"] == False
                 or self.grill_accessory is None):
-            # Reset probe alarm if accessory becomes unavailable
-            self.probe_alarm = False
             return False
-        else:
-            connected = self.grill_accessory["con"]
-            # Reset probe alarm if accessory is not connected
-            if not connected:
-                self.probe_alarm = False
-            return connected
+        return self.grill_accessory["con"]
 
     @property
     def unique_id(self):
@@ -304,35 +263,111 @@ class ProbeState(TraegerBaseSensor):
     # Sensor Properties
     @property
     def state(self):
-        if self.grill_accessory is None:
+        if self.grill_accessory is None or self.probe_state is None:
             return "idle"
+        return self.probe_state.state
 
-        target_temp = self.grill_accessory["probe"]["set_temp"]
-        probe_temp = self.grill_accessory["probe"]["get_temp"]
-        target_changed = target_temp != self.previous_target_temp
-        grill_mode = self.grill_state["system_status"]
-        fell_out_temp = 102 if self.grill_units == TEMP_CELSIUS else 215
-
-        # Latch probe alarm, reset if target changed or grill leaves active modes
-        if self.grill_accessory["probe"]["alarm_fired"]:
-            self.probe_alarm = True
-        elif ((target_changed and target_temp != 0)
-                or (grill_mode not in self.active_modes)):
-            self.probe_alarm = False
-
-        if probe_temp >= fell_out_temp:
-            state = "fell_out"
-        elif self.probe_alarm:
-            state = "at_temp"
-        elif target_temp != 0 and grill_mode in self.active_modes:
-            close_temp = 3 if self.grill_units == TEMP_CELSIUS else 5
-            if probe_temp + close_temp >= target_temp:
-                state = "close"
-            else:
-                state = "set"
-        else:
-            self.probe_alarm = False
-            state = "idle"
 
-        self.previous_target_temp = target_temp
-        return state
+class ProbeTimeToTarget(TraegerBaseSensor):
+    """Estimated minutes until the probe reaches its set temperature."""
+
+    grill_fields = ("acc", "grill")
+
+    def __init__(self, client, grill_id, sensor_id):
+        self.sensor_id = sensor_id
+        super().__init__(client, grill_id, f"Probe Time To Target {sensor_id}", f"probe_eta_{sensor_id}")
+
+    def grill_refresh_state(self):
+        """Refresh the probe's estimator along with the grill state"""
+        super().grill_refresh_state()
+        self.estimator = self.client.get_probe_estimator(self.grill_id, self.sensor_id)
+
+    # Generic Properties
+    @property
+    def available(self):
+        """Reports unavailable when the probe is not connected"""
+        return bool(self.grill_snapshot and self.grill_snapshot.connected and self.estimator is not None)
+
+    @property
+    def unique_id(self):
+        return f"{self.grill_id}_probe_eta_{self.sensor_id}"
+
+    @property
+    def icon(self):
+        return "mdi:timer-sand"
+
+    # Sensor Properties
+    @property
+    def state(self):
+        if self.estimator is None or self.estimator.eta is None:
+            return None
+        return round(self.estimator.eta / 60)
+
+    @property
+    def unit_of_measurement(self):
+        return "min"
+
+    @property
+    def extra_state_attributes(self):
+        if self.estimator is None:
+            return None
+        rate = self.estimator.rate
+        eta = self.estimator.eta
+        return {
+            "rate_per_hour": None if rate is None else round(rate * 3600, 1),
+            "stalled": self.estimator.stalled,
+            "done_at": None if eta is None else (dt_util.utcnow() + timedelta(seconds=eta)).isoformat(),
+        }
+
+
+class TraegerMetricSensor(Entity):
+    """Diagnostic sensor for one client metric, on a device for the account."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    def __init__(self, client, entry_id, metric, friendly_name, unit, icon):
+        self.client = client
+        self.entry_id = entry_id
+        self.metric = client.metrics.get(metric)
+        self.metric_name = metric
+        self.friendly_name = friendly_name
+        self._attr_unit_of_measurement = unit
+        self._attr_icon = icon
+
+    @property
+    def name(self):
+        return f"{NAME} {self.client.username} {self.friendly_name}"
+
+    @property
+    def unique_id(self):
+        return f"{self.entry_id}_{self.metric_name}"
+
+    @property
+    def device_info(self):
+        return {
+            "identifiers": {(DOMAIN, self.entry_id)},
+            "name": f"{NAME} {self.client.username}",
+            "manufacturer": NAME,
+            "entry_type": DeviceEntryType.SERVICE,
+        }
+
+    @property
+    def state(self):
+        if self.metric.kind == "histogram":
+            mean = self.metric.mean()
+            return None if mean is None else round(mean * 1000, 3)
+        value = self.metric.value
+        return round(value) if isinstance(value, float) else value
+
+    @property
+    def extra_state_attributes(self):
+        if self.metric.kind == "histogram":
+            summary = self.metric.as_dict()
+            return {
+                "count": summary["count"],
+                **{f"{key}_ms": None if summary[key] is None else round(summary[key] * 1000, 3)
+                   for key in ("last", "p50", "p99")},
+            }
+        if getattr(self.metric, "label", None):
+            return self.metric.as_dict()
+        return None
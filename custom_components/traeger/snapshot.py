@@ -0,0 +1,105 @@
+"""
+Read-only per grill state built from one MQTT status message.
+"""
+from homeassistant.components.climate.const import HVAC_MODE_OFF
+from homeassistant.const import TEMP_CELSIUS, TEMP_FAHRENHEIT
+
+from .const import GRILL_MODE_HVAC_MODES, GRILL_MODE_STATES
+
+
+def index_accessories(status):
+    """Map accessory uuid to accessory for one status message."""
+    return {accessory["uuid"]: accessory for accessory in status.get("acc", ())}
+
+
+class GrillSnapshot:
+    """Everything the integration uses from one grill message.
+
+    A snapshot is built once per message and published by replacing the
+    single reference in traeger.grill_status, so a reader that grabbed it
+    always sees status, details, limits, settings, features and accessories
+    from the same message. Snapshots and the dicts they hold are never
+    modified after publishing; use with_status() to derive a new one.
+    Sections the integration never reads (usage and the like) are dropped.
+    accessories maps accessory uuid to its entry in status["acc"].
+
+    It also carries the values every entity of the grill derives from the
+    message (units, availability, display name, grill state and hvac mode),
+    computed once here instead of once per entity.
+    """
+
+    __slots__ = (
+        "grill_id",
+        "status",
+        "details",
+        "limits",
+        "settings",
+        "features",
+        "accessories",
+        "units",
+        "connected",
+        "friendly_name",
+        "grill_state",
+        "hvac_mode",
+    )
+
+    def __init__(self, grill_id, status, details, limits, settings, features, accessories):
+        set_field = object.__setattr__
+        set_field(self, "grill_id", grill_id)
+        set_field(self, "status", status)
+        set_field(self, "details", details)
+        set_field(self, "limits", limits)
+        set_field(self, "settings", settings)
+        set_field(self, "features", features)
+        set_field(self, "accessories", accessories)
+        set_field(self, "units", TEMP_CELSIUS if status["units"] == 0 else TEMP_FAHRENHEIT)
+        set_field(self, "connected", status["connected"])
+        set_field(self, "friendly_name", details["friendlyName"] if details else grill_id)
+        system_status = status["system_status"]
+        set_field(self, "grill_state", GRILL_MODE_STATES.get(system_status, "unknown"))
+        set_field(self, "hvac_mode", GRILL_MODE_HVAC_MODES.get(system_status, HVAC_MODE_OFF))
+
+    @classmethod
+    def from_message(cls, grill_id, message):
+        status = message["status"]
+        return cls(
+            grill_id,
+            status,
+            message.get("details"),
+            message.get("limits"),
+            message.get("settings"),
+            message.get("features"),
+            index_accessories(status),
+        )
+
+    def message(self):
+        """Return the parts of the message the snapshot was built from."""
+        return {
+            "status": self.status,
+            "details": self.details,
+            "limits": self.limits,
+            "settings": self.settings,
+            "features": self.features,
+        }
+
+    def with_status(self, **fields):
+        """Return a copy with the given status fields replaced."""
+        status = {**self.status, **fields}
+        return GrillSnapshot(
+            self.grill_id,
+            status,
+            self.details,
+            self.limits,
+            self.settings,
+            self.features,
+            index_accessories(status) if "acc" in fields else self.accessories,
+        )
+
+    def __setattr__(self, name, value):
+        raise AttributeError("GrillSnapshot is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("GrillSnapshot is immutable")
+
+    def __repr__(self):
+        return f"GrillSnapshot(status={self.status!r})"
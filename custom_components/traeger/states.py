@@ -0,0 +1,142 @@
+"""
+Heating and probe state machines, advanced once per grill message.
+
+Their next state depends on the previous one, so they run in the ingest path
+for every status the grill sends (traeger.grill_transitions) and the sensors
+only read the stored result. Reading a sensor never moves a machine.
+"""
+from homeassistant.const import TEMP_CELSIUS
+
+from .const import (
+    GRILL_MIN_TEMP_C,
+    GRILL_MIN_TEMP_F,
+    GRILL_MODE_COOL_DOWN,
+    GRILL_MODE_CUSTOM_COOK,
+    GRILL_MODE_IGNITING,
+    GRILL_MODE_MANUAL_COOK,
+    GRILL_MODE_PREHEATING,
+)
+
+PREHEAT_MODES = (GRILL_MODE_PREHEATING, GRILL_MODE_IGNITING)
+COOK_MODES = (GRILL_MODE_CUSTOM_COOK, GRILL_MODE_MANUAL_COOK)
+PROBE_ACTIVE_MODES = PREHEAT_MODES + COOK_MODES
+
+
+class HeatingStateMachine:
+    """Where the grill is relative to its set temperature."""
+
+    __slots__ = ("state", "previous_target_temp")
+
+    def __init__(self):
+        self.state = "idle"
+        self.previous_target_temp = None
+
+    def update(self, status, units):
+        target_temp = status["set"]
+        grill_mode = status["system_status"]
+        current_temp = status["grill"]
+        previous_state = self.state
+        target_changed = target_temp != self.previous_target_temp
+        min_cook_temp = GRILL_MIN_TEMP_C if units == TEMP_CELSIUS else GRILL_MIN_TEMP_F
+        temp_swing = 11 if units == TEMP_CELSIUS else 20
+        low_temp = target_temp - temp_swing
+        high_temp = target_temp + temp_swing
+
+        if grill_mode in PREHEAT_MODES:
+            if current_temp < min_cook_temp:
+                state = "preheating"
+            else:
+                state = "heating"
+        elif grill_mode in COOK_MODES:
+            if previous_state == "heating" or previous_state == "preheating":
+                if current_temp >= target_temp:
+                    state = "at_temp"
+                else:
+                    state = "heating"
+            elif previous_state == "cooling":
+                if current_temp <= target_temp:
+                    state = "at_temp"
+                else:
+                    state = "cooling"
+            elif previous_state == "at_temp":
+                if current_temp > high_temp:
+                    state = "over_temp"
+                elif current_temp < low_temp:
+                    state = "under_temp"
+                else:
+                    state = "at_temp"
+            elif previous_state == "under_temp":
+                if current_temp > low_temp:
+                    state = "at_temp"
+                else:
+                    state = "under_temp"
+            elif previous_state == "over_temp":
+                if current_temp < high_temp:
+                    state = "at_temp"
+                else:
+                    state = "over_temp"
+            # Catch all if coming from idle/unavailable
+            else:
+                target_changed = True
+
+            if target_changed:
+                if current_temp <= target_temp:
+                    state = "heating"
+                else:
+                    state = "cooling"
+        elif grill_mode == GRILL_MODE_COOL_DOWN:
+            state = "cool_down"
+        else:
+            state = "idle"
+
+        self.previous_target_temp = target_temp
+        self.state = state
+        return state
+
+
+class ProbeStateMachine:
+    """Where one probe is relative to its set temperature, with the alarm latched."""
+
+    __slots__ = ("state", "previous_target_temp", "probe_alarm")
+
+    def __init__(self):
+        self.state = "idle"
+        self.previous_target_temp = None
+        self.probe_alarm = False
+
+    def update(self, status, accessory, units):
+        # Reset probe alarm if the grill or the probe is not connected
+        if not status["connected"] or not accessory["con"]:
+            self.probe_alarm = False
+
+        probe = accessory["probe"]
+        target_temp = probe["set_temp"]
+        probe_temp = probe["get_temp"]
+        target_changed = target_temp != self.previous_target_temp
+        grill_mode = status["system_status"]
+        fell_out_temp = 102 if units == TEMP_CELSIUS else 215
+
+        # Latch probe alarm, reset if target changed or grill leaves active modes
+        if probe["alarm_fired"]:
+            self.probe_alarm = True
+        elif ((target_changed and target_temp != 0)
+                or (grill_mode not in PROBE_ACTIVE_MODES)):
+            self.probe_alarm = False
+
+        if probe_temp >= fell_out_temp:
+            state = "fell_out"
+        elif self.probe_alarm:
+            state = "at_temp"
+        elif target_temp != 0 and grill_mode in PROBE_ACTIVE_MODES:
+            close_temp = 3 if units == TEMP_CELSIUS else 5
+            if probe_temp + close_temp >= target_temp:
+                state = "close"
+            else:
+                state = "set"
+        else:
+            self.probe_alarm = False
+            state = "idle"
+
+        self.previous_target_temp = target_temp
+        self.state = state
+        return state
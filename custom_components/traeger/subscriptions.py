@@ -0,0 +1,102 @@
+"""
+Registry of per grill update callbacks.
+"""
+import weakref
+
+
+class Subscription:
+    """One callback, the fields it watches and how it is referenced."""
+
+    __slots__ = ("key", "ref", "fields")
+
+    def __init__(self, key, ref, fields):
+        self.key = key
+        self.ref = ref
+        self.fields = fields
+
+
+def _callback_key(callback):
+    """Identity of a callback; bound methods of the same object compare equal."""
+    owner = getattr(callback, "__self__", None)
+    if owner is None:
+        return id(callback)
+    return (id(owner), callback.__func__)
+
+
+class SubscriptionRegistry:
+    """Callbacks per grill, indexed by the status fields they watch.
+
+    subscribe() returns an unsubscribe callable. Subscribing the same
+    callback again replaces its fields rather than adding a second entry.
+    With weak=True only a weak reference is kept and the subscription is
+    dropped once the owner is garbage collected.
+    """
+
+    def __init__(self):
+        self.subscriptions = {}
+        self.field_index = {}
+
+    def subscribe(self, grill_id, callback, fields=None, weak=False):
+        key = _callback_key(callback)
+        self.unsubscribe(grill_id, key)
+        if weak:
+            if hasattr(callback, "__self__"):
+                ref = weakref.WeakMethod(callback)
+            else:
+                ref = weakref.ref(callback)
+        else:
+            ref = lambda: callback
+        fields = (None,) if fields is None else tuple(fields)
+        subscription = Subscription(key, ref, fields)
+        self.subscriptions.setdefault(grill_id, {})[key] = subscription
+        index = self.field_index.setdefault(grill_id, {})
+        for field in fields:
+            index.setdefault(field, {})[key] = subscription
+
+        def remove():
+            if self.subscriptions.get(grill_id, {}).get(key) is subscription:
+                self.unsubscribe(grill_id, key)
+
+        return remove
+
+    def unsubscribe(self, grill_id, key):
+        subscription = self.subscriptions.get(grill_id, {}).pop(key, None)
+        if subscription is None:
+            return
+        index = self.field_index[grill_id]
+        for field in subscription.fields:
+            watchers = index.get(field)
+            if watchers is not None:
+                watchers.pop(key, None)
+                if not watchers:
+                    del index[field]
+
+    def callbacks(self, grill_id, changed=None):
+        """Return the live callbacks watching any changed field, or all of them."""
+        if changed is None:
+            subscriptions = list(self.subscriptions.get(grill_id, {}).values())
+        else:
+            index = self.field_index.get(grill_id)
+            if not index:
+                return []
+            matched = dict(index.get(None, {}))
+            for field in changed:
+                watchers = index.get(field)
+                if watchers:
+                    matched.update(watchers)
+            subscriptions = matched.values()
+        callbacks = []
+        for subscription in list(subscriptions):
+            callback = subscription.ref()
+            if callback is None:
+                self.unsubscribe(grill_id, subscription.key)
+            else:
+                callbacks.append(callback)
+        return callbacks
+
+    def clear(self):
+        self.subscriptions.clear()
+        self.field_index.clear()
+
+    def __len__(self):
+        return sum(len(subscriptions) for subscriptions in self.subscriptions.values())
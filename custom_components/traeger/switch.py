@@ -32,17 +32,23 @@ class TraegerBaseSwitch(SwitchEntity, TraegerBaseEntity):
         """Return the name of the grill"""
         if self.grill_details is None:
             return f"{self.grill_id}_{self.devname}"              #Returns EntID
-        name = self.grill_details["friendlyName"]
-        return f"{name} {self.friendly_name}"              #Returns Friendly Name
+        return self.grill_entity_name(self.friendly_name)   #Returns Friendly Name
 
     @property
     def unique_id(self):
         return f"{self.grill_id}_{self.devname}"                  #SeeminglyDoes Nothing?
 
+    def grill_watched_fields(self):
+        if self.grill_fields is None:
+            return None
+        return super().grill_watched_fields() + (self.devname,)
+
 
 class TraegerConnectEntity(TraegerBaseSwitch):
     """Traeger Switch class."""
 
+    grill_fields = ()
+
     # Generic Properties
     @property
     def icon(self):
@@ -67,9 +73,10 @@ class TraegerConnectEntity(TraegerBaseSwitch):
 class TraegerSwitchEntity(TraegerBaseSwitch):
     """Traeger Switch class."""
 
+    grill_fields = ("system_status", "features")
+
     def __init__(self, client, grill_id, devname, friendly_name, iconinp, on_cmd, off_cmd):
         super().__init__(client, grill_id, devname, friendly_name)
-        self.grill_register_callback()
         self.iconinp = iconinp
         self.on_cmd = on_cmd
         self.off_cmd = off_cmd
@@ -8,12 +8,10 @@ Please see the LICENSE file that should have been included as part of this packa
 """
 
 import time
-import ssl
 import paho.mqtt.client as mqtt
 import requests
 import uuid
 import urllib
-import json
 import threading
 import datetime
 import asyncio
@@ -23,122 +21,358 @@ import async_timeout
 import aiohttp
 import homeassistant.const
 
+from .const import (
+    DEFAULT_COMMAND_INTERVAL,
+    DEFAULT_MQTT_TRANSPORT,
+    DEFAULT_OPTIMISTIC_TIMEOUT,
+    DEFAULT_STALL_THRESHOLD,
+    MQTT_TRANSPORT_ASYNCIO,
+    STATE_SAVE_DELAY,
+)
+from .auth import AUTH_RETRY_DELAY, TokenAuthError, TokenError, TokenManager
+from .commands import CommandQueue, CommandTracker
+from .decoder import loads as json_loads
+from .estimators import PelletEstimator, ProbeEstimator
+from .history import GrillHistory
+from .ingest import MessageIngest
+from .metrics import MetricsRegistry
+from .mqtt_async import AsyncMqttClient
+from .optimistic import (
+    OptimisticValue,
+    apply_overlay,
+    command_expectations,
+    get_path,
+    reconcile,
+)
+from .reactor import TraegerReactor
+from .snapshot import GrillSnapshot
+from .states import HeatingStateMachine, ProbeStateMachine
+from .subscriptions import SubscriptionRegistry
+from .watchdog import LoopWatchdog, WatchedLoop
+
 
 CLIENT_ID = "2fuohjtqv1e63dckp5v84rau0j"
+COGNITO_URL = "https://cognito-idp.us-west-2.amazonaws.com/"
+API_URL = "https://1ywgyc65d1.execute-api.us-west-2.amazonaws.com/prod"
 TIMEOUT = 60
 
+ROTATION_RETRY_DELAY = 30   # Seconds before trying again to replace the MQTT connection after a failed try
+
+# Sections of a grill message that are watched as a whole, next to the status keys.
+GRILL_SECTIONS = ("details", "limits", "settings", "features")
+
 
 _LOGGER: logging.Logger = logging.getLogger(__package__)
 
 class traeger:
-    def __init__(self, username, password, hass, request_library):
+    def __init__(self, username, password, hass, request_library, mqtt_transport=DEFAULT_MQTT_TRANSPORT, token_store=None,
+                 command_interval=DEFAULT_COMMAND_INTERVAL, optimistic_timeout=DEFAULT_OPTIMISTIC_TIMEOUT,
+                 state_store=None, reactor=None, api_url=API_URL, cognito_url=COGNITO_URL,
+                 stall_threshold=DEFAULT_STALL_THRESHOLD):
         self.username = username
+        self.api_url = api_url
+        self.cognito_url = cognito_url
         self.password = password
         self.mqtt_uuid = str(uuid.uuid1())
         self.mqtt_thread_running = False
-        self.mqtt_thread_refreshing = False
         self.grills_active = False
         self.hass = hass
         self.loop = hass.loop
+        self.reactor = reactor if reactor is not None else TraegerReactor(hass.loop)
+        self.timers = self.reactor
+        self.metrics = MetricsRegistry()
+        self.watchdog = None
+        if stall_threshold > 0:                                 #Time everything we schedule on the loop
+            self.watchdog = LoopWatchdog(stall_threshold, self.metrics)
+            self.loop = WatchedLoop(hass.loop, self.watchdog)
+            self.timers = WatchedLoop(self.reactor, self.watchdog)
         self.task = None
         self.mqtt_url = None
         self.mqtt_client = None
+        self.mqtt_client_next = None                            #Rotation candidate until it is subscribed
+        self.mqtt_rotation_retry = False                        #Rotate on the next main, the last try failed
+        self.grills = []
+        self.grills_stale = False
         self.grill_status = {}
+        self.grill_confirmed = {}
+        self.grill_history = {}
+        self.probe_estimators = {}
+        self.pellet_estimators = {}
+        self.heating_states = {}
+        self.probe_states = {}
+        self.state_store = state_store
+        self.state_save_pending = False                         #A delayed save is scheduled
         self.access_token = None
-        self.token = None
-        self.token_expires = 0
+        self.auth = TokenManager(self.loop, username, self.do_cognito, token_store, self.timers, self.metrics)
         self.mqtt_url_expires = time.time()
         self.request = request_library
-        self.grill_callbacks = {}
-        self.mqtt_client_inloop = False
+        self.grill_callbacks = SubscriptionRegistry()
         self.autodisconnect = False
+        self.mqtt_transport = mqtt_transport
+        self.ingest = MessageIngest(self.loop, self.watched(self.grill_message))
+        self.commands_outstanding = set()
+        self.command_interval = command_interval
+        self.command_queues = {}
+        self.grills_refreshed = set()                           #Grills sent a refresh on this connection
+        self.grills_updated = set()                             #Grills that reported on this connection
+        self.optimistic_timeout = optimistic_timeout
+        self.optimistic = {}
+        self.optimistic_timers = {}
+        self.setup_metrics()
+        self.command_tracker = CommandTracker(self.loop, self.command_refresh, self.timers, self.metrics)
+
+    def watched(self, callback):
+        """callback, timed by the stall watchdog when it is enabled."""
+        return callback if self.watchdog is None else self.watchdog.wrap(callback)
+
+    def create_task(self, coro):
+        """hass.async_create_task, with each step timed by the stall watchdog when it is enabled."""
+        if self.watchdog is not None:
+            coro = self.watchdog.coroutine(coro)
+        return self.hass.async_create_task(coro)
+
+    def setup_metrics(self):
+        metrics = self.metrics
+        metrics.gauge("messages_received", "MQTT messages received", lambda: self.ingest.received, "counter")
+        metrics.gauge("messages_coalesced", "MQTT messages dropped for a newer one of the same grill",
+                      lambda: self.ingest.coalesced, "counter")
+        self.metric_decode = metrics.histogram("message_decode_seconds", "Time to decode a grill message")
+        self.metric_dispatch = metrics.histogram("message_dispatch_seconds",
+                                                 "Time to run the entity callbacks of a grill message")
+        self.metric_connects = metrics.counter("mqtt_connects", "MQTT connections established")
+        self.metric_reconnects = metrics.counter("mqtt_reconnects", "MQTT connections lost and reconnected")
+        self.metric_connect_failures = metrics.counter("mqtt_connect_failures", "MQTT connection attempts that failed")
+        self.metric_rotations = metrics.counter("mqtt_rotations", "MQTT connections replaced for a new signed URL")
+        self.metric_url_refresh = metrics.histogram("mqtt_url_refresh_seconds", "Time to fetch a signed MQTT URL")
+        self.metric_api_errors = metrics.counter("api_errors", "Failed cloud API requests", "kind")
+        metrics.gauge("token_renewals", "Cognito token renewals", lambda: self.auth.renewals, "counter")
+        metrics.gauge("token_remaining_seconds", "Seconds until the Cognito token expires", self.token_remaining)
+        metrics.gauge("mqtt_url_remaining_seconds", "Seconds until the signed MQTT URL expires",
+                      self.mqtt_url_remaining)
 
     def token_remaining(self):
-        return self.token_expires - time.time()
-
-    async def do_cognito(self):
+        return self.auth.remaining()
+
+    async def do_cognito(self, auth_flow="USER_PASSWORD_AUTH", auth_parameters=None):
+        if auth_parameters is None:
+            auth_parameters = {
+                "PASSWORD": self.password,
+                "USERNAME": self.username,
+            }
         t = datetime.datetime.utcnow()
         amzdate = t.strftime('%Y%m%dT%H%M%SZ')
-        return await self.api_wrapper("post", "https://cognito-idp.us-west-2.amazonaws.com/",
+        return await self.api_wrapper("post", self.cognito_url,
                                       data={
-                                              "ClientMetadata": {},
-                                              "AuthParameters": {
-                                                  "PASSWORD": self.password,
-                                                  "USERNAME": self.username,
-                                              },
-                                          "AuthFlow": "USER_PASSWORD_AUTH",
+                                          "ClientMetadata": {},
+                                          "AuthParameters": auth_parameters,
+                                          "AuthFlow": auth_flow,
                                           "ClientId": CLIENT_ID
                                       },
                                       headers={'Content-Type': 'application/x-amz-json-1.1',
                                                'X-Amz-Date': amzdate,
                                                'X-Amz-Target': 'AWSCognitoIdentityProviderService.InitiateAuth'})
 
-    async def refresh_token(self):
-        if self.token_remaining() < 60:
-            request_time = time.time()
-            response = await self.do_cognito()
-            self.token_expires = response["AuthenticationResult"]["ExpiresIn"] + request_time
-            self.token = response["AuthenticationResult"]["IdToken"]
+    async def load_token(self):
+        """Restore the Cognito tokens persisted by a previous run."""
+        await self.auth.async_load()
+
+    async def load_state(self):
+        """Restore the grill list and last status persisted by a previous run,
+        so entities have names and state before the first MQTT message."""
+        if self.state_store is None:
+            return
+        data = await self.state_store.async_load()
+        if data is None or data.get("username") != self.username:
+            return
+        self.grills = data["grills"]
+        self.grills_stale = True                                #Refreshed from the API once connected
+        for grill_id, message in data["messages"].items():
+            snapshot = GrillSnapshot.from_message(grill_id, message)
+            self.grill_confirmed[grill_id] = snapshot
+            self.grill_status[grill_id] = snapshot
+            self.grill_transitions(grill_id, snapshot)
+        for grill_id, pellets in data.get("pellet_rates", {}).items():
+            rates = {(system_status, bucket): rate for system_status, bucket, rate in pellets["rates"]}
+            self.pellet_estimators[grill_id] = PelletEstimator(pellets["units"], rates)
+        _LOGGER.debug(f"Restored state for {list(data['messages'])}")
+
+    def state_data(self):
+        self.state_save_pending = False                         #Written now, the next change schedules again
+        return {
+            "username": self.username,
+            "grills": self.grills,
+            "messages": {grill_id: snapshot.message() for grill_id, snapshot in self.grill_confirmed.items()},
+            "pellet_rates": {                                   #Learned burn rates carry over to the next cook
+                grill_id: {
+                    "units": estimator.units,
+                    "rates": [[system_status, bucket, rate] for (system_status, bucket), rate in estimator.rates.items()],
+                }
+                for grill_id, estimator in self.pellet_estimators.items()
+            },
+        }
+
+    def save_state(self):
+        """Write the state within STATE_SAVE_DELAY seconds.
+
+        async_delay_save restarts its timer on every call, so it is only
+        called when no save is pending, or steady messages would hold the
+        write back until shutdown.
+        """
+        if self.state_store is not None and not self.state_save_pending:
+            self.state_save_pending = True
+            self.state_store.async_delay_save(self.state_data, STATE_SAVE_DELAY)
 
     async def get_user_data(self):
-        await self.refresh_token()
-        return await self.api_wrapper("get", "https://1ywgyc65d1.execute-api.us-west-2.amazonaws.com/prod/users/self",
-                                   headers={'authorization': self.token})
+        token = await self.auth.async_get_token()
+        return await self.api_wrapper("get", f"{self.api_url}/users/self",
+                                   headers={'authorization': token})
 
     async def send_command(self, thingName, command):
+        """Queue a command for the grill and wait until it has been posted.
+
+        Returns its TrackedCommand, await that for whether the grill applied it.
+        """
+        confirmed = self.grill_confirmed.get(thingName)
+        tracked = self.command_tracker.track(thingName, command, confirmed)
+        self.optimistic_command(thingName, command)
+        queue = self.command_queues.get(thingName)
+        if queue is None:
+            queue = CommandQueue(self.loop, thingName, self.post_command, self.command_interval)
+            self.command_queues[thingName] = queue
+        await queue.send(command)
+        return tracked
+
+    def command_refresh(self, thingName):
+        """Ask for the status of a grill whose command went unconfirmed."""
+        self.create_task(self.update_state(thingName))
+
+    def optimistic_command(self, thingName, command):
+        """Show the expected result of command until the grill confirms it."""
+        confirmed = self.grill_confirmed.get(thingName)
+        if self.optimistic_timeout <= 0 or confirmed is None:
+            return
+        expectations = command_expectations(command, confirmed.status)
+        if not expectations:
+            return
+        deadline = time.time() + self.optimistic_timeout
+        overlay = self.optimistic.setdefault(thingName, {})
+        for path, expected in expectations.items():
+            overlay[path] = OptimisticValue(expected, get_path(confirmed, path), deadline)
+        self.optimistic_publish(thingName)
+
+    def optimistic_publish(self, thingName):
+        """Publish the confirmed snapshot with whatever overlay is still pending."""
+        confirmed = self.grill_confirmed[thingName]
+        overlay = self.optimistic.get(thingName)
+        timer = self.optimistic_timers.pop(thingName, None)
+        if timer is not None:
+            timer.cancel()
+        if overlay:
+            reconcile(overlay, confirmed, time.time())
+        if not overlay:
+            self.optimistic.pop(thingName, None)
+            self.grill_publish(thingName, confirmed)
+            return
+        self.grill_publish(thingName, confirmed.with_status(**apply_overlay(confirmed.status, overlay)))
+        deadline = min(value.deadline for value in overlay.values())
+        self.optimistic_timers[thingName] = self.loop.call_later(
+            max(deadline - time.time(), 0), self.optimistic_publish, thingName
+        )
+
+    def get_command_stats(self, thingName):
+        queue = self.command_queues.get(thingName)
+        if queue is None:
+            return None
+        return queue.stats()
+
+    async def post_command(self, thingName, command):
         _LOGGER.debug("Send Command Topic: %s, Send Command: %s", thingName, command)
-        await self.refresh_token()
-        await self.api_wrapper("post_raw", "https://1ywgyc65d1.execute-api.us-west-2.amazonaws.com/prod/things/{}/commands".format(thingName),
-                               data={
-            'command': command
-        },
-            headers={
-            'Authorization': self.token,
-            "Content-Type": "application/json",
-            "Accept-Language": "en-us",
-            "User-Agent": "Traeger/11 CFNetwork/1209 Darwin/20.2.0",
-        })
+        self.commands_outstanding.add(thingName)
+        tracked = self.command_tracker.sending(thingName, command)
+        accepted = False
+        try:
+            token = await self.auth.async_get_token()
+            http_status = await self.api_wrapper("post_raw", f"{self.api_url}/things/{thingName}/commands",
+                                                 data={
+                                                     'command': command
+                                                 },
+                                                 headers={
+                                                     'Authorization': token,
+                                                     "Content-Type": "application/json",
+                                                     "Accept-Language": "en-us",
+                                                     "User-Agent": "Traeger/11 CFNetwork/1209 Darwin/20.2.0",
+                                                 })
+            accepted = http_status is not None and http_status < 400
+        finally:
+            self.command_tracker.sent(tracked, accepted)
 
     async def update_state(self, thingName):
-        await self.send_command(thingName, "90")
+        return await self.send_command(thingName, "90")
 
     async def set_temperature(self, thingName, temp):
-        await self.send_command(thingName, "11,{}".format(temp))
+        return await self.send_command(thingName, "11,{}".format(temp))
 
     async def set_probe_temperature(self, thingName, temp):
-        await self.send_command(thingName, "14,{}".format(temp))
+        return await self.send_command(thingName, "14,{}".format(temp))
 
     async def set_switch(self, thingName, switchval):
-        await self.send_command(thingName, str(switchval))
+        return await self.send_command(thingName, str(switchval))
 
     async def shutdown_grill(self, thingName):
-        await self.send_command(thingName, "17")
+        return await self.send_command(thingName, "17")
 
     async def set_timer_sec(self, thingName, time_s):
-        await self.send_command(thingName, "12,{}".format(time_s))
+        return await self.send_command(thingName, "12,{}".format(time_s))
 
     async def update_grills(self):
         json = await self.get_user_data()
         self.grills = json["things"]
+        self.grills_stale = False
+        self.save_state()
 
     def get_grills(self):
         return self.grills
 
-    def set_callback_for_grill(self, grill_id, callback):
-        if grill_id not in self.grill_callbacks:
-            self.grill_callbacks[grill_id] = []
-        self.grill_callbacks[grill_id].append(callback)
+    def set_callback_for_grill(self, grill_id, callback, fields=None, weak=False):
+        """Call callback on updates touching any of fields (status keys or
+        sections), or on every update when fields is None.
+        Returns a callable that removes the callback again."""
+        return self.grill_callbacks.subscribe(grill_id, callback, fields, weak)
+
+    @staticmethod
+    def changed_fields(previous, current):
+        """Return the status keys and sections that differ between two messages."""
+        old_status = previous.status
+        new_status = current.status
+        changed = {key for key, value in new_status.items()
+                   if key not in old_status or old_status[key] != value}
+        changed.update(key for key in old_status if key not in new_status)
+        for section in GRILL_SECTIONS:
+            if getattr(previous, section) != getattr(current, section):
+                changed.add(section)
+        return changed
+
+    def grill_dispatch(self, grill_id, changed=None):
+        """Call the callbacks watching any changed field, or all when changed is None."""
+        watchdog = self.watchdog
+        for callback in self.grill_callbacks.callbacks(grill_id, changed):
+            if watchdog is None:
+                callback()
+            else:
+                watchdog.call(callback)
 
     def mqtt_url_remaining(self):
         return self.mqtt_url_expires - time.time()
 
     async def refresh_mqtt_url(self):
-        await self.refresh_token()
+        token = await self.auth.async_get_token()
         if self.mqtt_url_remaining() < 60:
             try:
                 mqtt_request_time = time.time()
-                json = await self.api_wrapper("post", "https://1ywgyc65d1.execute-api.us-west-2.amazonaws.com/prod/mqtt-connections",
-                                           headers={'Authorization': self.token})
+                started = time.perf_counter()
+                json = await self.api_wrapper("post", f"{self.api_url}/mqtt-connections",
+                                           headers={'Authorization': token})
+                self.metric_url_refresh.time(started)
                 self.mqtt_url_expires = json["expirationSeconds"] + \
                     mqtt_request_time
                 self.mqtt_url = json["signedUrl"]
@@ -156,136 +390,286 @@ class traeger:
                 )
         _LOGGER.debug(f"MQTT URL:{self.mqtt_url} Expires @:{self.mqtt_url_expires}")
 
-    def _mqtt_connect_func(self):
-        if self.mqtt_client != None:
-            _LOGGER.debug(f"Start MQTT Loop Forever")
-            while self.mqtt_thread_running:
-                self.mqtt_client_inloop = True
-                self.mqtt_client.loop_forever()
-                self.mqtt_client_inloop = False
-                while (self.mqtt_url_remaining() < 60 or self.mqtt_thread_refreshing) and self.mqtt_thread_running:
-                    time.sleep(1)
-        _LOGGER.debug(f"Should be the end of the thread.")
+    def get_mqtt_ssl_context(self):
+        return self.reactor.ssl_context()
 
     async def get_mqtt_client(self):
+        """Connect on the current signed URL.
+
+        When a connection is already up this is a rotation: the new client
+        connects and subscribes next to the old one, and replaces it in
+        mqtt_promote once subscribed, so updates never stop (make before break).
+        """
         await self.refresh_mqtt_url()
-        if self.mqtt_client != None:
-            _LOGGER.debug(f"ReInit Client")
+        if self.mqtt_client_next is not None:                       #Previous rotation never completed
+            self.mqtt_retire(self.mqtt_client_next)
+            self.mqtt_client_next = None
+        if self.mqtt_transport == MQTT_TRANSPORT_ASYNCIO:
+            client = self.get_async_mqtt_client()
         else:
-            self.mqtt_client = mqtt.Client(transport="websockets")
-            #self.mqtt_client.on_log = self.mqtt_onlog                  #logging passed via enable_logger this would be redundant.
-            self.mqtt_client.on_connect = self.mqtt_onconnect
-            self.mqtt_client.on_connect_fail = self.mqtt_onconnectfail
-            self.mqtt_client.on_subscribe = self.mqtt_onsubscribe
-            self.mqtt_client.on_message = self.mqtt_onmessage
-            if _LOGGER.level <= 10:                                     #Add these callbacks only if our logging is Debug or less.
-                self.mqtt_client.enable_logger(_LOGGER)
-                self.mqtt_client.on_publish = self.mqtt_onpublish       #We dont Publish to MQTT
-                self.mqtt_client.on_unsubscribe = self.mqtt_onunsubscribe
-                self.mqtt_client.on_disconnect = self.mqtt_ondisconnect
-                self.mqtt_client.on_socket_open = self.mqtt_onsocketopen
-                self.mqtt_client.on_socket_close = self.mqtt_onsocketclose
-                self.mqtt_client.on_socket_register_write = self.mqtt_onsocketregisterwrite
-                self.mqtt_client.on_socket_unregister_write = self.mqtt_onsocketunregisterwrite
-            context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
-            context.check_hostname = False
-            context.verify_mode = ssl.CERT_NONE
-            self.mqtt_client.tls_set_context(context)
-            self.mqtt_client.reconnect_delay_set(min_delay=10, max_delay=160)
+            client = self.get_paho_mqtt_client()
+        if self.mqtt_client is None:
+            self.mqtt_client = client
+        else:
+            _LOGGER.debug(f"Rotating MQTT connection")
+            self.mqtt_client_next = client
+        self.mqtt_connect(client)
+        self.mqtt_thread_running = True
+
+    def get_paho_mqtt_client(self):
+        client = mqtt.Client(transport="websockets")
+        #client.on_log = self.mqtt_onlog                                #logging passed via enable_logger this would be redundant.
+        client.on_connect = self.mqtt_onconnect
+        client.on_connect_fail = self.mqtt_onconnectfail
+        client.on_subscribe = self.mqtt_onsubscribe
+        client.on_message = self.mqtt_onmessage
+        client.on_disconnect = self.mqtt_ondisconnect                   #Counts reconnects
+        if _LOGGER.level <= 10:                                         #Add these callbacks only if our logging is Debug or less.
+            client.enable_logger(_LOGGER)
+            client.on_publish = self.mqtt_onpublish                     #We dont Publish to MQTT
+            client.on_unsubscribe = self.mqtt_onunsubscribe
+        #The socket callbacks belong to the reactor, which drives the client.
+        client.reconnect_delay_set(min_delay=10, max_delay=160)
+        return client
+
+    def get_async_mqtt_client(self):
+        """Run the MQTT session on the event loop instead of a paho thread."""
+        client = AsyncMqttClient(self.request, str(uuid.uuid1()), keepalive=300)  #Unique id, both may be connected
+        client.on_connect = self.mqtt_onconnect
+        client.on_connect_fail = self.mqtt_onconnectfail
+        client.on_subscribe = self.mqtt_onsubscribe
+        client.on_message = self.mqtt_onmessage
+        client.on_disconnect = self.mqtt_ondisconnect
+        client.reconnect_delay_set(min_delay=10, max_delay=160)
+        return client
+
+    def mqtt_connect(self, client):
+        if self.mqtt_transport == MQTT_TRANSPORT_ASYNCIO:
+            client.connect_async(self.mqtt_url, self.get_mqtt_ssl_context())
+            return
         mqtt_parts = urllib.parse.urlparse(self.mqtt_url)
         headers = {
             "Host": "{0:s}".format(mqtt_parts.netloc),
         }
-        self.mqtt_client.ws_set_options(path="{}?{}".format(
-        mqtt_parts.path, mqtt_parts.query), headers=headers)     
+        client.ws_set_options(path="{}?{}".format(
+        mqtt_parts.path, mqtt_parts.query), headers=headers)
+        secure = mqtt_parts.scheme == "wss"
+        if secure:
+            client.tls_set_context(self.get_mqtt_ssl_context())
+        port = mqtt_parts.port or (443 if secure else 80)
         _LOGGER.info(f"Thread Active Count:{threading.active_count()}")
-        self.mqtt_client.connect(mqtt_parts.netloc, 443, keepalive=300)
-        if self.mqtt_thread_running == False:
-            self.mqtt_thread = threading.Thread(target=self._mqtt_connect_func)
-            self.mqtt_thread_running = True
-            self.mqtt_thread.start()
+        self.reactor.connect(client, mqtt_parts.hostname, port, keepalive=300, watchdog=self.watchdog)
+
+    def mqtt_promote(self, client):
+        """The rotated connection is subscribed, retire the old one."""
+        if client is not self.mqtt_client_next:
+            return
+        _LOGGER.debug(f"MQTT connection rotated")
+        old = self.mqtt_client
+        self.mqtt_client = client
+        self.mqtt_client_next = None
+        self.metric_rotations.inc()
+        self.mqtt_retire(old)
+
+    def mqtt_retire(self, client):
+        if self.mqtt_transport == MQTT_TRANSPORT_ASYNCIO:
+            self.create_task(client.async_disconnect())
+        else:
+            self.reactor.disconnect(client)
 
 #===========================Paho MQTT Functions=======================================================
     def mqtt_onlog(self, client, userdata, level, buf):
         _LOGGER.debug(f"OnLog Callback. Client:{client} userdata:{userdata} level:{level} buf:{buf}")
     def mqtt_onconnect(self, client, userdata, flags, rc):
         _LOGGER.info("Grill Connected")
-        for grill in self.grills:
-            grill_id = grill["thingName"]
-            if grill_id in self.grill_status:
-                del self.grill_status[grill_id]
-            client.subscribe(
-                ("prod/thing/update/{}".format(grill_id), 1))
+        self.metric_connects.inc()
+        if client is not self.mqtt_client_next:                     #A rotation keeps the current state
+            self.loop.call_soon_threadsafe(self.refresh_reset)
+        topics = [("prod/thing/update/{}".format(grill["thingName"]), 1) for grill in self.grills]
+        if topics:
+            client.subscribe(topics)                                #One SUBSCRIBE for all grills
     def mqtt_onconnectfail(self, client, userdata):
         _LOGGER.debug(f"Connect Fail Callback. Client:{client} userdata:{userdata}")
+        self.metric_connect_failures.inc()
+        if client is self.mqtt_client_next:                         #Rotation failed, the current connection still works
+            _LOGGER.warning(f"MQTT rotation connect failed, retrying in {ROTATION_RETRY_DELAY} seconds.")
+            self.mqtt_client_next = None
+            self.mqtt_retire(client)
+            self.mqtt_rotation_retry = True
+            if self.task is not None:
+                self.task.cancel()
+            self.task = self.timers.call_later(ROTATION_RETRY_DELAY, self.syncmain)
+            return
         _LOGGER.warning("Grill Connect Failed! MQTT Client Kill.")
-        self.hass.async_create_task(self.kill())                    #Shutdown if we arn't getting anywhere.
+        self.create_task(self.kill())                               #Shutdown if we arn't getting anywhere.
     def mqtt_onsubscribe(self, client, userdata, mid, granted_qos):
         _LOGGER.debug(f"OnSubscribe Callback. Client:{client} userdata:{userdata} mid:{mid} granted_qos:{granted_qos}")
-        for grill in self.grills:
-            grill_id = grill["thingName"]
-            if grill_id in self.grill_status:
-                del self.grill_status[grill_id]
-            #self.update_state(grill_id)
-            self.hass.async_create_task(self.update_state(grill_id))
+        if client is self.mqtt_client_next:
+            self.loop.call_soon_threadsafe(self.mqtt_promote, client)
+        else:
+            self.loop.call_soon_threadsafe(self.refresh_grills)
     def mqtt_onmessage(self, client, userdata, message):
         _LOGGER.debug("grill_message: message.topic = %s, message.payload = %s", message.topic, message.payload)
-        _LOGGER.info(f"Token Time Remaining:{self.token_remaining()} MQTT Time Remaining:{self.mqtt_url_remaining()}")
         if message.topic.startswith("prod/thing/update/"):
             grill_id = message.topic[len("prod/thing/update/"):]
-            self.grill_status[grill_id] = json.loads(message.payload)
-            if grill_id in self.grill_callbacks:
-                for callback in self.grill_callbacks[grill_id]:
-                    callback()
-            if self.grills_active == False:                         #Go see if any grills are doing work.
-                for grill in self.grills:                           #If nobody is working next MQTT refresh
-                    grill_id = grill["thingName"]                   #It'll call kill.
-                    state = self.get_state_for_device(grill_id)
-                    if state == None:
-                        return
-                    if state["connected"]:
-                        if 4 <= state["system_status"] <= 8:
-                            self.grills_active = True
+            self.ingest.push(grill_id, message.payload, ack=grill_id in self.commands_outstanding)
     def mqtt_onpublish(self, client, userdata, mid):
         _LOGGER.debug(f"OnPublish Callback. Client:{client} userdata:{userdata} mid:{mid}")
     def mqtt_onunsubscribe(self, client, userdata, mid):
         _LOGGER.debug(f"OnUnsubscribe Callback. Client:{client} userdata:{userdata} mid:{mid}")
     def mqtt_ondisconnect(self, client, userdata, rc):
         _LOGGER.debug(f"OnDisconnect Callback. Client:{client} userdata:{userdata} rc:{rc}")
-    def mqtt_onsocketopen(self, client, userdata, sock):
-        _LOGGER.debug(f"Sock.Open.Report...Client: {client} UserData: {userdata} Sock: {sock}")
-    def mqtt_onsocketclose(self, client, userdata, sock):
-        _LOGGER.debug(f"Sock.Clse.Report...Client: {client} UserData: {userdata} Sock: {sock}")
-    def mqtt_onsocketregisterwrite(self, client, userdata, sock):
-        _LOGGER.debug(f"Sock.Regi.Write....Client: {client} UserData: {userdata} Sock: {sock}")
-    def mqtt_onsocketunregisterwrite(self, client, userdata, sock):
-        _LOGGER.debug(f"Sock.UnRg.Write....Client: {client} UserData: {userdata} Sock: {sock}")
+        if rc != 0:                                                 #Not asked for, the client reconnects
+            self.metric_reconnects.inc()
 #===========================/Paho MQTT Functions=======================================================
 
+    def refresh_reset(self):
+        """A new connection, every grill may be refreshed once more."""
+        self.grills_refreshed.clear()
+        self.grills_updated.clear()
+
+    def refresh_grills(self):
+        """Ask each grill for its status once per connection, unless it already reported."""
+        pending = [grill["thingName"] for grill in self.grills
+                   if grill["thingName"] not in self.grills_refreshed
+                   and grill["thingName"] not in self.grills_updated]
+        if not pending:
+            return
+        self.grills_refreshed.update(pending)
+        self.create_task(self.async_refresh_grills(pending))
+
+    async def async_refresh_grills(self, grill_ids):
+        results = await asyncio.gather(*[self.update_state(grill_id) for grill_id in grill_ids],
+                                       return_exceptions=True)
+        for grill_id, result in zip(grill_ids, results):
+            if isinstance(result, Exception):
+                _LOGGER.warning(f"Status refresh for {grill_id} failed: {result!r}")
+
+    def grill_publish(self, grill_id, snapshot):
+        """Swap in a new snapshot and wake the entities watching what changed."""
+        previous = self.grill_status.get(grill_id)
+        self.grill_status[grill_id] = snapshot
+        if previous is None:
+            self.grill_dispatch(grill_id)
+        else:
+            self.grill_dispatch(grill_id, self.changed_fields(previous, snapshot))
+
+    def grill_message(self, grill_id, payload):
+        """Apply a status payload. Runs on the event loop via self.ingest."""
+        self.commands_outstanding.discard(grill_id)
+        self.grills_updated.add(grill_id)
+        started = time.perf_counter()
+        self.grill_confirmed[grill_id] = GrillSnapshot.from_message(grill_id, json_loads(payload))
+        self.metric_decode.time(started)
+        snapshot = self.grill_confirmed[grill_id]
+        now = time.time()
+        history = self.grill_history.get(grill_id)
+        if history is None:
+            history = self.grill_history[grill_id] = GrillHistory()
+        history.append(snapshot.status, now)
+        self.grill_transitions(grill_id, snapshot)
+        self.grill_estimate(grill_id, snapshot, now)
+        self.command_tracker.status_update(grill_id, snapshot)
+        started = time.perf_counter()
+        if grill_id in self.optimistic:
+            self.optimistic_publish(grill_id)
+        else:
+            self.grill_publish(grill_id, self.grill_confirmed[grill_id])
+        self.metric_dispatch.time(started)
+        self.save_state()
+        if self.grills_active == False:                         #Go see if any grills are doing work.
+            for grill in self.grills:                           #If nobody is working next MQTT refresh
+                grill_id = grill["thingName"]                   #It'll call kill.
+                state = self.get_state_for_device(grill_id)
+                if state == None:
+                    return
+                if state["connected"]:
+                    if 4 <= state["system_status"] <= 8:
+                        self.grills_active = True
+
+    def get_snapshot_for_device(self, thingName):
+        return self.grill_status.get(thingName)
+
+    def grill_transitions(self, grill_id, snapshot):
+        """Advance the heating and probe state machines, once per status."""
+        heating = self.heating_states.get(grill_id)
+        if heating is None:
+            heating = self.heating_states[grill_id] = HeatingStateMachine()
+        heating.update(snapshot.status, snapshot.units)
+        probes = self.probe_states.setdefault(grill_id, {})
+        for probe_id, accessory in snapshot.accessories.items():
+            if accessory["type"] != "probe":
+                continue
+            machine = probes.get(probe_id)
+            if machine is None:
+                machine = probes[probe_id] = ProbeStateMachine()
+            machine.update(snapshot.status, accessory, snapshot.units)
+
+    def get_heating_state(self, thingName):
+        return self.heating_states.get(thingName)
+
+    def get_probe_state(self, thingName, probe_id):
+        return self.probe_states.get(thingName, {}).get(probe_id)
+
+    def grill_estimate(self, grill_id, snapshot, now):
+        """Feed the streaming estimators one status."""
+        estimators = self.probe_estimators.setdefault(grill_id, {})
+        for probe_id, accessory in snapshot.accessories.items():
+            if accessory["type"] != "probe":
+                continue
+            if not accessory["con"]:                                #Start over once it is back
+                estimators.pop(probe_id, None)
+                continue
+            estimator = estimators.get(probe_id)
+            if estimator is None:
+                estimator = estimators[probe_id] = ProbeEstimator(snapshot.units)
+            probe = accessory["probe"]
+            estimator.update(now, probe["get_temp"], snapshot.status["grill"], probe["set_temp"], snapshot.units)
+        status = snapshot.status
+        if snapshot.features and snapshot.features.get("pellet_sensor_connected") == 1 and "pellet_level" in status:
+            estimator = self.pellet_estimators.get(grill_id)
+            if estimator is None:
+                estimator = self.pellet_estimators[grill_id] = PelletEstimator(snapshot.units)
+            estimator.update(now, status["pellet_level"], status["set"], status["system_status"], snapshot.units)
+
+    def get_probe_estimator(self, thingName, probe_id):
+        return self.probe_estimators.get(thingName, {}).get(probe_id)
+
+    def get_pellet_estimator(self, thingName):
+        return self.pellet_estimators.get(thingName)
+
+    def get_history_for_device(self, thingName):
+        return self.grill_history.get(thingName)
+
     def get_state_for_device(self, thingName):
-        if thingName not in self.grill_status:
+        snapshot = self.grill_status.get(thingName)
+        if snapshot is None:
             return None
-        return self.grill_status[thingName]["status"]
+        return snapshot.status
 
     def get_details_for_device(self, thingName):
-        if thingName not in self.grill_status:
+        snapshot = self.grill_status.get(thingName)
+        if snapshot is None:
             return None
-        return self.grill_status[thingName]["details"]
+        return snapshot.details
 
     def get_limits_for_device(self, thingName):
-        if thingName not in self.grill_status:
+        snapshot = self.grill_status.get(thingName)
+        if snapshot is None:
             return None
-        return self.grill_status[thingName]["limits"]
+        return snapshot.limits
 
     def get_settings_for_device(self, thingName):
-        if thingName not in self.grill_status:
+        snapshot = self.grill_status.get(thingName)
+        if snapshot is None:
             return None
-        return self.grill_status[thingName]["settings"]
+        return snapshot.settings
 
     def get_features_for_device(self, thingName):
-        if thingName not in self.grill_status:
+        snapshot = self.grill_status.get(thingName)
+        if snapshot is None:
             return None
-        return self.grill_status[thingName]["features"]
+        return snapshot.features
 
     def get_cloudconnect(self, thingName):
         if thingName not in self.grill_status:
@@ -293,48 +677,51 @@ class traeger:
         return self.mqtt_thread_running
 
     def get_units_for_device(self, thingName):
-        state = self.get_state_for_device(thingName)
-        if state is None:
-            return homeassistant.const.TEMP_FAHRENHEIT
-        if state["units"] == 0:
-            return homeassistant.const.TEMP_CELSIUS
-        else:
+        snapshot = self.grill_status.get(thingName)
+        if snapshot is None:
             return homeassistant.const.TEMP_FAHRENHEIT
+        return snapshot.units
 
     def get_details_for_accessory(self, thingName, accessory_id):
-        state = self.get_state_for_device(thingName)
-        if state is None:
+        snapshot = self.grill_status.get(thingName)
+        if snapshot is None:
             return None
-        for accessory in state["acc"]:
-            if accessory["uuid"] == accessory_id:
-                return accessory
-        return None
+        return snapshot.accessories.get(accessory_id)
 
     async def start(self, delay):
-        await self.update_grills()
+        if not self.grills_stale:                               #Nothing restored, platforms need the list now
+            await self.update_grills()
+        self.auth.start()
         self.grills_active = True
         _LOGGER.info(f"Call_Later in: {delay} seconds.")
-        self.task = self.loop.call_later(delay, self.syncmain)
+        self.task = self.timers.call_later(delay, self.syncmain)
 
     def syncmain(self):
         _LOGGER.debug(f"@Call_Later SyncMain CreatingTask for async Main.")
-        self.hass.async_create_task(self.main())
+        self.create_task(self.main())
 
     async def main(self):
         _LOGGER.debug(f"Current Main Loop Time: {time.time()}")
         _LOGGER.debug(f"MQTT Logger Token Time Remaining:{self.token_remaining()} MQTT Time Remaining:{self.mqtt_url_remaining()}")
-        if self.mqtt_url_remaining() < 60:
-            self.mqtt_thread_refreshing = True
-            if self.mqtt_thread_running:
-                self.mqtt_client.disconnect()
-                self.mqtt_client = None
-            await self.get_mqtt_client()
-            self.mqtt_thread_refreshing = False
+        if self.grills_stale:
+            try:
+                await self.update_grills()
+            except Exception as exception:  # pylint: disable=broad-except
+                _LOGGER.warning(f"Failed to refresh the grill list, using the restored one: {exception!r}")
+        retry = 30
+        if self.mqtt_url_remaining() < 60 or self.mqtt_rotation_retry:
+            self.mqtt_rotation_retry = False
+            try:
+                await self.get_mqtt_client()
+            except TokenError as exception:                 #No token, try again next run
+                _LOGGER.warning(f"Could not renew the token to connect: {exception}")
+                if isinstance(exception, TokenAuthError):   #Don't hammer Cognito with a bad password
+                    retry = AUTH_RETRY_DELAY
         _LOGGER.debug(f"Call_Later @: {self.mqtt_url_expires}")
         delay = self.mqtt_url_remaining()
-        if delay < 30:
-            delay = 30
-        self.task = self.loop.call_later(delay, self.syncmain)
+        if delay < retry:
+            delay = retry
+        self.task = self.timers.call_later(delay, self.syncmain)
 
     async def kill(self):
         if self.mqtt_thread_running:
@@ -343,18 +730,37 @@ class traeger:
             self.task.cancel()
             _LOGGER.debug(f"Task Info: {self.task} TaskCancelled Status: {self.task.cancelled()}")
             self.task = None
+            self.auth.stop()
             self.mqtt_thread_running = False
-            self.mqtt_client.disconnect()
-            while self.mqtt_client_inloop:                  #Wait for disconnect to finish
-                await asyncio.sleep(0.25)
+            clients = [client for client in (self.mqtt_client, self.mqtt_client_next) if client is not None]
+            self.mqtt_client_next = None
+            if self.mqtt_transport == MQTT_TRANSPORT_ASYNCIO:
+                for client in clients:
+                    await client.async_disconnect()
+            else:
+                for client in clients:
+                    await self.reactor.async_disconnect(client)
             self.mqtt_url_expires = time.time()
+            self.command_tracker.cancel()
             for grill in self.grills:                       #Mark the grill(s) disconnected so they report unavail.
                 grill_id = grill["thingName"]               #Also hit the callbacks to update HA
-                self.grill_status[grill_id]["status"]["connected"] = False
-                for callback in self.grill_callbacks[grill_id]:
-                    callback()
+                timer = self.optimistic_timers.pop(grill_id, None)
+                if timer is not None:
+                    timer.cancel()
+                self.optimistic.pop(grill_id, None)
+                snapshot = self.grill_confirmed.get(grill_id)     #The persisted state keeps the last message
+                if snapshot is not None:
+                    self.grill_status[grill_id] = snapshot.with_status(connected=False)
+                self.grill_dispatch(grill_id)
         else:
             _LOGGER.info(f"Task Already Dead")
+            if self.task is not None:                       #Killed before main ran, don't let it connect
+                self.task.cancel()
+                self.task = None
+            self.auth.stop()
+        for queue in self.command_queues.values():          #Nothing more is posted for this client
+            queue.cancel()
+        self.command_queues.clear()
 
     async def api_wrapper(
         self, method: str, url: str, data: dict = {}, headers: dict = {}
@@ -364,18 +770,18 @@ class traeger:
             async with async_timeout.timeout(TIMEOUT):
                 if method == "get":
                     response = await self.request.get(url, headers=headers)
-                    data = await response.read()
-                    return json.loads(data)
+                    return json_loads(await response.read())
 
                 if method == "post_raw":
-                     await self.request.post(url, headers=headers, json=data)
+                    response = await self.request.post(url, headers=headers, json=data)
+                    return response.status
 
                 elif method == "post":
                     response = await self.request.post(url, headers=headers, json=data)
-                    data = await response.read()
-                    return json.loads(data)
+                    return json_loads(await response.read())
 
         except asyncio.TimeoutError as exception:
+            self.metric_api_errors.inc("timeout")
             _LOGGER.error(
                 "Timeout error fetching information from %s - %s",
                 url,
@@ -383,16 +789,19 @@ class traeger:
             )
 
         except (KeyError, TypeError) as exception:
+            self.metric_api_errors.inc("parse")
             _LOGGER.error(
                 "Error parsing information from %s - %s",
                 url,
                 exception,
             )
         except (aiohttp.ClientError, socket.gaierror) as exception:
+            self.metric_api_errors.inc("connection")
             _LOGGER.error(
                 "Error fetching information from %s - %s",
                 url,
                 exception,
             )
         except Exception as exception:  # pylint: disable=broad-except
+            self.metric_api_errors.inc("other")
             _LOGGER.error("Something really wrong happend! - %s", exception)
@@ -0,0 +1,24 @@
+"""HTTP views for Traeger."""
+from aiohttp import web
+
+from homeassistant.components.http import HomeAssistantView
+
+from .const import DOMAIN
+from .metrics import render_prometheus
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"     # Prometheus text exposition format
+
+
+class TraegerMetricsView(HomeAssistantView):
+    """Client metrics of every account in the Prometheus text format."""
+
+    url = "/api/traeger/metrics"
+    name = "api:traeger:metrics"
+
+    async def get(self, request):
+        hass = request.app["hass"]
+        clients = hass.data.get(DOMAIN, {})
+        body = render_prometheus(
+            ({"entry": entry_id}, client.metrics) for entry_id, client in clients.items()
+        )
+        return web.Response(text=body, headers={"Content-Type": CONTENT_TYPE})
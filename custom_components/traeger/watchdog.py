@@ -0,0 +1,228 @@
+"""
+Opt-in stall watchdog for the integration's work on the event loop.
+
+Everything the client runs on the loop (its callbacks and timers, message
+handling, entity callbacks and every step of its tasks) can be timed. Timed
+steps nest (a drain runs the message handler, which runs the entity
+callbacks), so each is charged its exclusive time, without the steps timed
+inside it. A step whose own time exceeds the threshold is a stall, recorded
+under its call site: the function for a callback, and for a coroutine the
+await it stopped at (or its last line), since that is where the blocking
+step ended. The worst sites are reported in the diagnostics.
+"""
+import functools
+import logging
+import os
+import time
+
+_LOGGER: logging.Logger = logging.getLogger(__package__)
+
+REPORT_SITES = 20           # Worst call sites reported in diagnostics
+
+PACKAGE_DIR = os.path.dirname(__file__)
+
+
+def callback_site(callback):
+    """Name and location of a callback, bound methods named after their object's class."""
+    while isinstance(callback, functools.partial):
+        callback = callback.func
+    func = getattr(callback, "__func__", callback)
+    owner = getattr(callback, "__self__", None)
+    name = getattr(func, "__qualname__", None) or repr(func)
+    if owner is not None and not isinstance(owner, type):
+        name = f"{type(owner).__name__}.{func.__name__}"
+    code = getattr(func, "__code__", None)
+    if code is None:
+        return name
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def coroutine_site(coro):
+    """The await a coroutine is suspended at, or its end.
+
+    Of the coroutines it is awaiting, the innermost one in this package is
+    named, rather than asyncio or a library it called into.
+    """
+    outer = getattr(coro, "__qualname__", repr(coro))
+    frame = None
+    while coro is not None:
+        inner = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if inner is None:
+            break
+        if frame is None or inner.f_code.co_filename.startswith(PACKAGE_DIR):
+            frame = inner
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    if frame is None:
+        return f"{outer} (returned)"
+    code = frame.f_code
+    return f"{outer} -> {code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+class StallSite:
+    """Stalls recorded for one call site."""
+
+    __slots__ = ("site", "count", "total", "worst", "last", "last_at")
+
+    def __init__(self, site):
+        self.site = site
+        self.count = 0
+        self.total = 0.0
+        self.worst = 0.0
+        self.last = 0.0
+        self.last_at = None
+
+    def as_dict(self):
+        return {
+            "site": self.site,
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 3),
+            "worst_ms": round(self.worst * 1000, 3),
+            "last_ms": round(self.last * 1000, 3),
+            "last_at": self.last_at,
+        }
+
+
+class LoopWatchdog:
+    """Times steps on the event loop and records those over threshold seconds."""
+
+    def __init__(self, threshold, metrics=None):
+        self.threshold = threshold
+        self.nested = 0.0                                   #Time of the steps timed inside the current one
+        self.depth = 0
+        self.steps = 0
+        self.stalls = 0
+        self.sites = {}
+        self.metric_stalls = None
+        if metrics is not None:
+            self.metric_stalls = metrics.histogram("loop_stall_seconds",
+                                                   "Integration steps that held the event loop over the threshold")
+
+    def start(self):
+        """Begin a step, pass what this returns to record()."""
+        outer = self.nested
+        self.nested = 0.0
+        self.depth += 1
+        return time.perf_counter(), outer
+
+    def record(self, step, site):
+        """End a step. site is a string or a callable returning one."""
+        started, outer = step
+        total = time.perf_counter() - started
+        elapsed = total - self.nested                       #Exclusive of the steps timed inside it
+        self.nested = outer + total
+        self.depth -= 1
+        if not self.depth:                                  #Only steps of the loop itself count
+            self.steps += 1
+        if elapsed < self.threshold:
+            return
+        if callable(site):
+            site = site()
+        stats = self.sites.get(site)
+        if stats is None:
+            stats = self.sites[site] = StallSite(site)
+            _LOGGER.warning(f"{site} blocked the event loop for {elapsed * 1000:.1f} ms")
+        stats.count += 1
+        stats.total += elapsed
+        stats.last = elapsed
+        stats.last_at = time.time()
+        if elapsed > stats.worst:
+            stats.worst = elapsed
+        self.stalls += 1
+        if self.metric_stalls is not None:
+            self.metric_stalls.observe(elapsed)
+
+    def call(self, callback, *args):
+        step = self.start()
+        try:
+            return callback(*args)
+        finally:
+            self.record(step, lambda: callback_site(callback))
+
+    def wrap(self, callback):
+        """callback, timed on every call."""
+        @functools.wraps(callback)
+        def watched(*args):
+            return self.call(callback, *args)
+        return watched
+
+    async def coroutine(self, coro):
+        """Run coro with each of its steps timed."""
+        return await WatchedSteps(self, coro)
+
+    def report(self, limit=REPORT_SITES):
+        """Totals and the worst call sites, by their longest stall."""
+        worst = sorted(self.sites.values(), key=lambda stats: stats.worst, reverse=True)
+        return {
+            "threshold_ms": round(self.threshold * 1000, 3),
+            "steps": self.steps,
+            "stalls": self.stalls,
+            "sites": [stats.as_dict() for stats in worst[:limit]],
+        }
+
+
+class WatchedSteps:
+    """Awaitable driving a coroutine one step (send or throw) at a time, timing each."""
+
+    __slots__ = ("watchdog", "coro")
+
+    def __init__(self, watchdog, coro):
+        self.watchdog = watchdog
+        self.coro = coro
+
+    def __await__(self):
+        coro = self.coro
+        start = self.watchdog.start
+        record = self.watchdog.record
+        site = lambda: coroutine_site(coro)
+        value = error = None
+        while True:
+            step = start()
+            try:
+                if error is None:
+                    future = coro.send(value)
+                else:
+                    future = coro.throw(error)
+            except StopIteration as stop:
+                record(step, site)
+                return stop.value
+            except BaseException:
+                record(step, site)
+                raise
+            record(step, site)
+            value = error = None
+            try:
+                value = yield future
+            except GeneratorExit:                           #Closed, not thrown into
+                coro.close()
+                raise
+            except BaseException as exception:  # pylint: disable=broad-except
+                error = exception
+
+
+class WatchedLoop:
+    """Stands in for the event loop, or the reactor, scheduling watched callbacks and tasks.
+
+    Everything else is passed through to the wrapped object.
+    """
+
+    def __init__(self, target, watchdog):
+        self.target = target
+        self.watchdog = watchdog
+
+    def __getattr__(self, name):
+        return getattr(self.target, name)
+
+    def call_soon(self, callback, *args, **kwargs):
+        return self.target.call_soon(self.watchdog.wrap(callback), *args, **kwargs)
+
+    def call_soon_threadsafe(self, callback, *args, **kwargs):
+        return self.target.call_soon_threadsafe(self.watchdog.wrap(callback), *args, **kwargs)
+
+    def call_later(self, delay, callback, *args, **kwargs):
+        return self.target.call_later(delay, self.watchdog.wrap(callback), *args, **kwargs)
+
+    def call_at(self, when, callback, *args, **kwargs):
+        return self.target.call_at(when, self.watchdog.wrap(callback), *args, **kwargs)
+
+    def create_task(self, coro, **kwargs):
+        return self.target.create_task(self.watchdog.coroutine(coro), **kwargs)